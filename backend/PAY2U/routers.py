@@ -0,0 +1,123 @@
+import itertools
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import LazyObject, empty
+
+PIN_KEY = 'db:primary_pin:user:{user_id}'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_request_state = ContextVar('replica_request_state', default=None)
+_force_primary = ContextVar('replica_force_primary', default=False)
+
+
+def _replica_cycle():
+    """Бесконечный перебор реплик с учетом их весов"""
+    aliases = [
+        alias
+        for alias, weight in settings.DATABASE_REPLICAS.items()
+        for _ in range(weight)
+    ]
+    return itertools.cycle(aliases) if aliases else None
+
+
+def request_user_id(request):
+    """Пользователь запроса без обращения к базе.
+
+    Пользователь JWT появляется в запросе после аутентификации DRF,
+    ленивый пользователь сессии учитывается, только если он уже загружен.
+    """
+    user = request.__dict__.get('user')
+    if isinstance(user, LazyObject):
+        user = None if user._wrapped is empty else user._wrapped
+    if user is None or not user.is_authenticated:
+        return None
+    return user.pk
+
+
+class RequestState:
+    """Решение о чтении с основной базы для одного HTTP-запроса"""
+
+    def __init__(self, request):
+        self.request = request
+        self.pinned_users = {}
+
+    def use_primary(self):
+        if self.request.method not in SAFE_METHODS:
+            return True
+        user_id = request_user_id(self.request)
+        if user_id is None:
+            return False
+        if user_id not in self.pinned_users:
+            self.pinned_users[user_id] = bool(
+                cache.get(PIN_KEY.format(user_id=user_id))
+            )
+        return self.pinned_users[user_id]
+
+
+def pin_to_primary(user_id):
+    """Чтение пользователя с основной базы после его изменений"""
+    cache.set(
+        PIN_KEY.format(user_id=user_id), 1, settings.REPLICA_PIN_SECONDS
+    )
+
+
+@contextmanager
+def request_routing(request):
+    """Маршрутизация чтения внутри обработки HTTP-запроса"""
+    token = _request_state.set(RequestState(request))
+    try:
+        yield
+    finally:
+        _request_state.reset(token)
+
+
+@contextmanager
+def primary():
+    """Все чтения блока выполняются на основной базе"""
+    token = _force_primary.set(True)
+    try:
+        yield
+    finally:
+        _force_primary.reset(token)
+
+
+class ReplicaRouter:
+    """Роутер, отправляющий чтение HTTP-запросов на реплики.
+
+    Реплики перечислены в DATABASE_REPLICAS с весами, чтение распределяется
+    по ним по кругу пропорционально весам. На основной базе остаются
+    запись, чтение внутри транзакций, изменяющие HTTP-запросы, запросы
+    пользователя в течение REPLICA_PIN_SECONDS после его изменений и весь
+    код вне HTTP-запросов (команды, миграции).
+    """
+
+    def __init__(self):
+        self.replicas = _replica_cycle()
+
+    def use_primary(self):
+        if self.replicas is None or _force_primary.get():
+            return True
+        state = _request_state.get()
+        if state is None:
+            return True
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return True
+        return state.use_primary()
+
+    def db_for_read(self, model, **hints):
+        if self.use_primary():
+            return DEFAULT_DB_ALIAS
+        return next(self.replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
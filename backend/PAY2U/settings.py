@@ -1,13 +1,56 @@
 from datetime import timedelta
 import os
 from pathlib import Path
+import sys
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
+TESTING = sys.argv[1:2] == ['test']
+
 SUBSCRIBE_LIMIT = 3
 
+MAIN_PAGE_CACHE_TIMEOUT = int(os.getenv('MAIN_PAGE_CACHE_TIMEOUT', 300))
+
+IDEMPOTENCY_KEY_TTL = timedelta(
+    hours=int(os.getenv('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+)
+
+IDEMPOTENCY_PRUNE_SECONDS = int(os.getenv('IDEMPOTENCY_PRUNE_SECONDS', 3600))
+
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', 3600))
+
+RENEWAL_MAX_ATTEMPTS = int(os.getenv('RENEWAL_MAX_ATTEMPTS', 4))
+
+RENEWAL_RETRY_SECONDS = int(os.getenv('RENEWAL_RETRY_SECONDS', 3600))
+
+TASK_MAX_ATTEMPTS = int(os.getenv('TASK_MAX_ATTEMPTS', 5))
+
+TASK_RETRY_SECONDS = int(os.getenv('TASK_RETRY_SECONDS', 60))
+
+TASK_LEASE_SECONDS = int(os.getenv('TASK_LEASE_SECONDS', 600))
+
+QUERY_INSTRUMENTATION_SAMPLE_RATE = float(
+    os.getenv('QUERY_INSTRUMENTATION_SAMPLE_RATE', 0)
+)
+
+QUERY_BUDGET_ACTION = os.getenv('QUERY_BUDGET_ACTION', 'log')
+
+QUERY_BUDGETS = {
+    'api:main': 6,
+    'api:comparison': 2,
+    'api:cards-list-and-activate': 4,
+    'api:categories-catalog': 8,
+    'api:services-list': 5,
+    'api:services-detail': 4,
+    'api:services-best-offer': 4,
+    'api:users-subscriptions': 3,
+    'api:users-expenses': 4,
+    'api:users-cashback': 4,
+    'api:users-paids': 4,
+}
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
@@ -30,6 +73,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework',
     'rest_framework.authtoken',
@@ -44,12 +88,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.QueryInstrumentationMiddleware',
 ]
 
 ROOT_URLCONF = 'PAY2U.urls'
@@ -90,6 +136,61 @@ DATABASES = {
     }
 }
 
+DATABASE_REPLICAS = {}
+
+for index, replica in enumerate(os.getenv('DB_REPLICAS', '').split(), 1):
+    host, port, weight = (replica.split(':') + ['', ''])[:3]
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS[alias] = int(weight or 1)
+
+DATABASE_ROUTERS = ['PAY2U.routers.ReplicaRouter']
+
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+
+# Кэш по умолчанию подходит только для разработки: без DEBUG проверка
+# api.E001 требует общий для всех процессов кэш, например Redis.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Тесты (manage.py test) не требуют PostgreSQL и Redis: база SQLite и кэш
+# в памяти процесса.
+if TESTING:
+    SECRET_KEY = SECRET_KEY or 'django-insecure-test-key-for-manage-py-test'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'test.sqlite3',
+            # Файл вместо базы в памяти: параллельные потоки тестов ждут
+            # блокировку записи, а не получают ошибку сразу.
+            'TEST': {'NAME': BASE_DIR / 'test.sqlite3'},
+        },
+        # Реплика для тестов роутера: второе соединение с той же базой.
+        # Чтение с нее включается через DATABASE_REPLICAS в самих тестах.
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'test.sqlite3',
+            'TEST': {'MIRROR': 'default'},
+        },
+    }
+    DATABASE_REPLICAS = {}
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -151,6 +252,22 @@ DJOSER = {
     'HIDE_USERS': False,
 }
 
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.middleware': {
+            'handlers': ['console'],
+            'level': os.getenv('QUERY_INSTRUMENTATION_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(weeks=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(weeks=1),
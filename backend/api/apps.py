@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+        from .timing import install_serializer_timing
+
+        install_serializer_timing()
@@ -0,0 +1,204 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from PAY2U.routers import primary
+
+MAIN_PAGE_VERSION_KEY = 'main_page:version'
+MAIN_PAGE_USER_VERSION_KEY = 'main_page:user:{user_id}:version'
+MAIN_PAGE_KEY = 'main_page:user:{user_id}:{version}:{user_version}'
+MAIN_PAGE_STATS_KEY = 'main_page:stats:{name}'
+MAIN_PAGE_PENDING_KEY = 'main_page:rebuilds_pending'
+
+CATALOG_VERSION_KEY = 'catalog:version'
+CATALOG_KEY = 'catalog:{version}:{name}:{digest}'
+CATALOG_STATS_KEY = 'catalog:stats:{name}:{result}'
+CATALOG_NAMES = ('catalog', 'services', 'service', 'terms', 'featured')
+CATALOG_LOCK_TIMEOUT = 10
+CATALOG_LOCK_WAIT = 2
+CATALOG_LOCK_POLL = 0.05
+
+
+def _increment(key, delta=1):
+    """Изменение счетчика в кэше с созданием при отсутствии"""
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        if cache.add(key, delta, timeout=None):
+            return delta
+        return cache.incr(key, delta)
+
+
+def _main_page_key(user_id):
+    """Ключ кэша главной страницы с учетом текущих версий и признак
+    незавершенного пересчета сводки расходов"""
+    user_version_key = MAIN_PAGE_USER_VERSION_KEY.format(user_id=user_id)
+    values = cache.get_many(
+        [MAIN_PAGE_VERSION_KEY, user_version_key, MAIN_PAGE_PENDING_KEY]
+    )
+    key = MAIN_PAGE_KEY.format(
+        user_id=user_id,
+        version=values.get(MAIN_PAGE_VERSION_KEY, 0),
+        user_version=values.get(user_version_key, 0),
+    )
+    return key, values.get(MAIN_PAGE_PENDING_KEY, 0) > 0
+
+
+def cached_main_page(user, build):
+    """Данные главной страницы пользователя из кэша.
+
+    При промахе данные строятся вызовом build(user) по основной базе, чтобы
+    отставание реплик не попало в кэш, и сохраняются на
+    MAIN_PAGE_CACHE_TIMEOUT секунд. Ключ вычисляется до построения
+    данных, поэтому сброс кэша во время построения не оставит в кэше
+    устаревшую версию. Это верно, только если сброс выполняется после
+    фиксации изменений: сброс внутри транзакции дал бы чтению, начатому
+    до фиксации, сохранить старые данные под новой версией, поэтому
+    вызывающий код сбрасывает кэш в transaction.on_commit. Пока в
+    очереди есть пересчет сводки расходов, построенные данные не
+    сохраняются: итоги в них еще старые.
+    """
+    key, rebuilding = _main_page_key(user.id)
+    data = cache.get(key)
+    if data is not None:
+        _increment(MAIN_PAGE_STATS_KEY.format(name='hits'))
+        return data
+    _increment(MAIN_PAGE_STATS_KEY.format(name='misses'))
+    with primary():
+        data = build(user)
+    if not rebuilding:
+        cache.set(key, data, settings.MAIN_PAGE_CACHE_TIMEOUT)
+    return data
+
+
+def invalidate_main_page(user_id=None):
+    """Сброс кэша главной страницы пользователя или всех пользователей.
+
+    Внутри транзакции вызывается через transaction.on_commit.
+    """
+    if user_id is None:
+        return _increment(MAIN_PAGE_VERSION_KEY)
+    return _increment(MAIN_PAGE_USER_VERSION_KEY.format(user_id=user_id))
+
+
+def main_page_rebuild_started():
+    """Отметка поставленного в очередь пересчета сводки расходов.
+
+    Вызывается через transaction.on_commit вместе с постановкой задачи.
+    Отметки считаются счетчиком, поэтому порядок отметки и завершения
+    пересчета не важен.
+    """
+    _increment(MAIN_PAGE_PENDING_KEY)
+
+
+def main_page_rebuild_finished():
+    """Снятие отметки пересчета и сброс кэша главной страницы всех
+    пользователей.
+
+    Пересчет, упавший после всех попыток, отметку не снимает, и главная
+    страница строится без кэша, пока сводку не пересчитают.
+    """
+    _increment(MAIN_PAGE_PENDING_KEY, -1)
+    invalidate_main_page()
+
+
+def main_page_cache_stats():
+    """Количество попаданий и промахов кэша главной страницы"""
+    keys = {
+        name: MAIN_PAGE_STATS_KEY.format(name=name)
+        for name in ('hits', 'misses')
+    }
+    values = cache.get_many(keys.values())
+    return {name: values.get(key, 0) for name, key in keys.items()}
+
+
+def catalog_version():
+    """Текущая версия каталога.
+
+    Отсутствующая версия начинается с текущего времени в миллисекундах,
+    поэтому после очистки кэша версии не повторяют выданные раньше и
+    сохраненные клиентами ETag не совпадают с новыми данными.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def _catalog_key(name, parts):
+    """Ключ кэша каталога с учетом текущей версии каталога"""
+    digest = hashlib.md5(
+        '|'.join(str(part) for part in parts).encode()
+    ).hexdigest()
+    return CATALOG_KEY.format(
+        version=catalog_version(), name=name, digest=digest
+    )
+
+
+def cached_catalog(name, build, *parts):
+    """Данные каталога из кэша.
+
+    name - раздел каталога из CATALOG_NAMES, parts - все, от чего зависят
+    данные (адрес запроса, идентификаторы). При промахе данные строит
+    только тот процесс, который первым захватил блокировку ключа,
+    остальные до CATALOG_LOCK_WAIT секунд ждут его результат и лишь потом
+    строят данные сами. Данные строятся по основной базе.
+    """
+    key = _catalog_key(name, parts)
+    data = cache.get(key)
+    if data is not None:
+        _increment(CATALOG_STATS_KEY.format(name=name, result='hits'))
+        return data
+    _increment(CATALOG_STATS_KEY.format(name=name, result='misses'))
+
+    lock_key = f'{key}:lock'
+    locked = cache.add(lock_key, 1, CATALOG_LOCK_TIMEOUT)
+    if not locked:
+        deadline = time.monotonic() + CATALOG_LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(CATALOG_LOCK_POLL)
+            data = cache.get(key)
+            if data is not None:
+                return data
+    try:
+        with primary():
+            data = build()
+        cache.set(key, data, settings.CATALOG_CACHE_TIMEOUT)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return data
+
+
+def invalidate_catalog():
+    """Сброс кэша каталога.
+
+    Внутри транзакции вызывается через transaction.on_commit: иначе
+    чтение, начатое до фиксации, сохранит старые данные под новой
+    версией, и ETag каталога будет подтверждать их до следующего сброса.
+    """
+    catalog_version()
+    return _increment(CATALOG_VERSION_KEY)
+
+
+def catalog_cache_stats():
+    """Попадания, промахи и доля попаданий кэша по разделам каталога"""
+    keys = {
+        (name, result): CATALOG_STATS_KEY.format(name=name, result=result)
+        for name in CATALOG_NAMES
+        for result in ('hits', 'misses')
+    }
+    values = cache.get_many(keys.values())
+    stats = {}
+    for name in CATALOG_NAMES:
+        hits = values.get(keys[name, 'hits'], 0)
+        misses = values.get(keys[name, 'misses'], 0)
+        stats[name] = {
+            'hits': hits,
+            'misses': misses,
+            'ratio': hits / (hits + misses) if hits + misses else None,
+        }
+    return stats
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+LOCMEM_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Кэш должен быть общим для всех процессов.
+
+    В кэше хранятся версии главной страницы и каталога и закрепление
+    пользователей за основной базой. С LocMemCache у каждого процесса
+    gunicorn и обработчика очереди свои значения, и сброс кэша в одном
+    процессе не виден остальным. Без DEBUG такая настройка - ошибка.
+    """
+    if settings.DEBUG or settings.TESTING:
+        return []
+    return [
+        Error(
+            f'Кэш {alias} хранится в памяти процесса (LocMemCache), '
+            'сброс кэша не виден другим процессам.',
+            hint=(
+                'Укажите общий кэш в CACHE_BACKEND и CACHE_LOCATION, '
+                'например Redis из devops/.env_example.'
+            ),
+            id='api.E001',
+        )
+        for alias, config in settings.CACHES.items()
+        if config['BACKEND'] == LOCMEM_BACKEND
+    ]
@@ -0,0 +1,79 @@
+import hashlib
+from functools import wraps
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .cache import catalog_version
+from services.models import Service, Terms
+
+
+def conditional(version):
+    """Условный GET по ETag и Last-Modified.
+
+    version(request, *args, **kwargs) возвращает строку для ETag и дату
+    изменения (или None) без сериализации ответа. Если клиент прислал
+    совпадающий If-None-Match или If-Modified-Since, представление не
+    вызывается и возвращается 304. Когда version возвращает (None, None),
+    например для несуществующего объекта, запрос выполняется как обычно.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(self, request, *args, **kwargs):
+            tag, last_modified = version(request, *args, **kwargs)
+            if tag is None:
+                return view(self, request, *args, **kwargs)
+            etag = quote_etag(hashlib.md5(
+                f'{tag}|{request.build_absolute_uri()}'.encode()
+            ).hexdigest())
+            timestamp = (
+                int(last_modified.timestamp()) if last_modified else None
+            )
+            response = get_conditional_response(
+                request, etag=etag, last_modified=timestamp
+            )
+            if response is not None:
+                return response
+            response = view(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                response['ETag'] = etag
+                if timestamp is not None:
+                    response['Last-Modified'] = http_date(timestamp)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def catalog_tag(request, *args, **kwargs):
+    """Версия каталога для списков: одно чтение из кэша"""
+    return f'catalog:{catalog_version()}', None
+
+
+def service_tag(request, pk=None, **kwargs):
+    """Дата изменения сервиса, которая учитывает и изменения тарифов"""
+    try:
+        updated_at = Service.objects.filter(
+            pk=pk
+        ).values_list('updated_at', flat=True).first()
+    except ValueError:
+        return None, None
+    if updated_at is None:
+        return None, None
+    return f'service:{pk}:{updated_at.isoformat()}', updated_at
+
+
+def terms_tag(request, pk=None, term_pk=None, **kwargs):
+    """Дата изменения тарифа, его сервиса или категории сервиса"""
+    try:
+        dates = Terms.objects.filter(pk=term_pk, service=pk).values_list(
+            'updated_at', 'service__updated_at', 'service__category__updated_at'
+        ).first()
+    except ValueError:
+        return None, None
+    if dates is None:
+        return None, None
+    updated_at = max(dates)
+    return f'terms:{term_pk}:{updated_at.isoformat()}', updated_at
@@ -1,8 +1,25 @@
+import datetime
+
 import django_filters
+from django.utils import timezone
+from django_filters.constants import EMPTY_VALUES
+from rest_framework.filters import BaseFilterBackend
 
 from services.models import Service, Subscription
 
 
+class ServiceSearchFilter(BaseFilterBackend):
+    """Поиск сервисов с ранжированием по параметру q"""
+
+    search_param = 'q'
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '').strip()
+        if not text:
+            return queryset
+        return queryset.search(text)
+
+
 class ServiceFilter(django_filters.FilterSet):
     category = django_filters.NumberFilter(field_name='category__id')
     is_featured = django_filters.BooleanFilter()
@@ -12,20 +29,54 @@ class ServiceFilter(django_filters.FilterSet):
         fields = ['category', 'is_featured']
 
 
-class SubscriptionFilter(django_filters.FilterSet):
-    start_date = django_filters.DateFilter(
-        field_name="start_date",
-        lookup_expr='gte'
-    )
-    end_date = django_filters.DateFilter(
-        field_name="start_date",
-        lookup_expr='lte'
-    )
-    category = django_filters.NumberFilter(
-        field_name="service__category",
-        lookup_expr='exact'
+def start_of_day(value):
+    """Начало дня value в текущем часовом поясе"""
+    return timezone.make_aware(
+        datetime.datetime.combine(value, datetime.time.min)
     )
 
+
+class DayFilter(django_filters.DateFilter):
+    """Фильтр поля даты и времени по календарным дням.
+
+    lookup_expr gte оставляет записи начиная с начала дня, lte - до начала
+    следующего дня. Условие сравнивает саму колонку с границами интервала
+    в текущем часовом поясе, а не field__date, поэтому подходит для
+    индекса по колонке.
+    """
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        if self.distinct:
+            qs = qs.distinct()
+        if self.lookup_expr == 'gte':
+            return self.get_method(qs)(**{
+                f'{self.field_name}__gte': start_of_day(value)
+            })
+        if self.lookup_expr == 'lte':
+            return self.get_method(qs)(**{
+                f'{self.field_name}__lt': start_of_day(
+                    value + datetime.timedelta(days=1)
+                )
+            })
+        return super().filter(qs, value)
+
+
+class SubscriptionFilter(django_filters.FilterSet):
+    """Подписки за период по дате начала и по названию категории"""
+
+    start_date = DayFilter(field_name='start_date', lookup_expr='gte')
+    end_date = DayFilter(field_name='start_date', lookup_expr='lte')
+    category = django_filters.CharFilter(field_name='service__category__name')
+
     class Meta:
         model = Subscription
         fields = ['start_date', 'end_date', 'category']
+
+
+class PaidFilter(SubscriptionFilter):
+    """Подписки за период по дате окончания"""
+
+    start_date = DayFilter(field_name='end_date', lookup_expr='gte')
+    end_date = DayFilter(field_name='end_date', lookup_expr='lte')
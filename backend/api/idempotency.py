@@ -0,0 +1,80 @@
+from functools import wraps
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+def idempotent(view):
+    """Повтор запроса с тем же Idempotency-Key возвращает первый ответ.
+
+    Запрос выполняется в транзакции вместе с сохранением ответа. Запись
+    ключа блокируется, поэтому параллельный повтор дожидается первого
+    запроса и получает его ответ, не изменяя карты и подписки повторно.
+    Запросы без заголовка выполняются как обычно.
+    """
+
+    @wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view(self, request, *args, **kwargs)
+        if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+            return Response(
+                {'errors': 'Слишком длинный ключ идемпотентности.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        fingerprint = f'{request.method} {request.path}'[:255]
+        now = timezone.now()
+        with transaction.atomic():
+            record, created = (
+                IdempotencyKey.objects.select_for_update().get_or_create(
+                    user=request.user,
+                    key=key,
+                    defaults={
+                        'request': fingerprint,
+                        'expires_at': now + settings.IDEMPOTENCY_KEY_TTL,
+                    },
+                )
+            )
+            if not created and record.expires_at > now:
+                if record.request != fingerprint:
+                    return Response(
+                        {
+                            'errors': 'Ключ идемпотентности уже '
+                            'использован для другого запроса.'
+                        },
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                    )
+                return Response(record.response, status=record.status_code)
+
+            response = view(self, request, *args, **kwargs)
+            record.request = fingerprint
+            record.status_code = response.status_code
+            record.response = response.data
+            record.expires_at = now + settings.IDEMPOTENCY_KEY_TTL
+            record.save()
+            return response
+
+    return wrapper
+
+
+def prune_expired(batch_size, now=None):
+    """Удаление просроченных ключей пачками по batch_size.
+
+    Возвращает количество удаленных ключей.
+    """
+    expired = IdempotencyKey.objects.filter(
+        expires_at__lte=now or timezone.now()
+    )
+    total = 0
+    while batch := list(expired.values_list('id', flat=True)[:batch_size]):
+        total += IdempotencyKey.objects.filter(id__in=batch).delete()[0]
+    return total
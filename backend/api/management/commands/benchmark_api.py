@@ -0,0 +1,269 @@
+import json
+import math
+import re
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from services.models import Service, Subscription
+from users.models import User
+
+ENDPOINTS = {
+    'main': '/api/main/',
+    'catalog': '/api/categories/catalog/',
+    'services_list': '/api/services/',
+    'services_retrieve': '/api/services/{service_id}/',
+    'comparison': '/api/comparison/',
+    'expenses': '/api/user/expenses/',
+    'cashback': '/api/user/cashback/',
+    'paids': '/api/user/paids/',
+    'calendar': '/api/user/calendar/',
+}
+
+# Количество запросов к базе из заголовка Server-Timing, который отдает
+# QueryInstrumentationMiddleware
+SERVER_TIMING_QUERIES = re.compile(
+    r'(?:^|,)\s*db;[^,]*desc="(\d+) queries"'
+)
+
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class Command(BaseCommand):
+    """Команда для замера задержек основных эндпоинтов API"""
+
+    help = (
+        'Замер p50/p95/p99, пропускной способности и количества запросов '
+        'к базе для основных эндпоинтов. Запускается на базе, заполненной '
+        'командой seed_load. В режиме http количество запросов берется из '
+        'заголовка Server-Timing, поэтому сервер запускается с '
+        'QUERY_INSTRUMENTATION_SAMPLE_RATE=1.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode',
+            choices=('client', 'http'),
+            default='client',
+            help='client - тестовый клиент Django в процессе, '
+                 'http - параллельные запросы к запущенному серверу',
+        )
+        parser.add_argument(
+            '--url',
+            default='http://127.0.0.1:8000',
+            help='Адрес сервера для режима http',
+        )
+        parser.add_argument(
+            '--endpoints',
+            nargs='*',
+            choices=tuple(ENDPOINTS),
+            help='Эндпоинты для замера, по умолчанию все',
+        )
+        parser.add_argument('--requests', type=int, default=100)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=10,
+            help='Количество параллельных запросов в режиме http',
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            help='Пользователь для запросов, по умолчанию самый активный',
+        )
+        parser.add_argument('--output', help='Файл для сохранения JSON')
+        parser.add_argument(
+            '--compare',
+            help='JSON предыдущего запуска для поиска регрессий',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.1,
+            help='Допустимый относительный рост p95',
+        )
+
+    def get_user(self, user_id):
+        if user_id:
+            return User.objects.get(pk=user_id)
+        busiest = Subscription.objects.order_by().values('user').annotate(
+            total=Count('id')
+        ).order_by('-total').first()
+        if busiest is None:
+            raise CommandError('В базе нет подписок, запустите seed_load.')
+        return User.objects.get(pk=busiest['user'])
+
+    def get_paths(self, names):
+        service = Service.objects.annotate(
+            total=Count('subscriptions')
+        ).order_by('-total', 'id').first()
+        if service is None:
+            raise CommandError('В базе нет сервисов, запустите seed_load.')
+        return {
+            name: ENDPOINTS[name].format(service_id=service.id)
+            for name in names or ENDPOINTS
+        }
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        token = str(AccessToken.for_user(user))
+        paths = self.get_paths(options['endpoints'])
+        measure = (
+            self.measure_client if options['mode'] == 'client'
+            else self.measure_http
+        )
+        results = {
+            'mode': options['mode'],
+            'user': user.id,
+            'requests': options['requests'],
+            'created': timezone.now().isoformat(),
+            'endpoints': {},
+        }
+        for name, path in paths.items():
+            results['endpoints'][name] = measure(path, token, options)
+            self.report(name, results['endpoints'][name])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+        if options['compare']:
+            self.compare(results, options['compare'], options['threshold'])
+
+    def summary(self, path, timings, errors, elapsed, queries=None):
+        """Сводка замеров эндпоинта по выполненным запросам, время в мс"""
+        return {
+            'path': path,
+            'requests': len(timings),
+            'errors': errors,
+            'p50': percentile(timings, 50),
+            'p95': percentile(timings, 95),
+            'p99': percentile(timings, 99),
+            'rps': len(timings) / elapsed if elapsed else None,
+            'queries': queries,
+        }
+
+    def measure_client(self, path, token, options):
+        host = next(
+            (host for host in settings.ALLOWED_HOSTS if host != '*'),
+            'localhost',
+        ).lstrip('.')
+        client = Client(
+            HTTP_AUTHORIZATION=f'Bearer {token}', HTTP_HOST=host
+        )
+        for _ in range(options['warmup']):
+            client.get(path)
+        timings, errors, queries = [], 0, []
+        started = time.perf_counter()
+        for _ in range(options['requests']):
+            with CaptureQueriesContext(connection) as context:
+                request_started = time.perf_counter()
+                response = client.get(path)
+                timings.append((time.perf_counter() - request_started) * 1000)
+            queries.append(len(context.captured_queries))
+            errors += response.status_code >= 400
+        elapsed = time.perf_counter() - started
+        return self.summary(
+            path, timings, errors, elapsed, queries=max(queries, default=None)
+        )
+
+    def measure_http(self, path, token, options):
+        url = options['url'].rstrip('/') + path
+
+        def fetch(_):
+            request = urllib.request.Request(
+                url, headers={'Authorization': f'Bearer {token}'}
+            )
+            request_started = time.perf_counter()
+            queries = None
+            try:
+                with urllib.request.urlopen(request) as response:
+                    response.read()
+                    failed = False
+                    match = SERVER_TIMING_QUERIES.search(
+                        response.headers.get('Server-Timing', '')
+                    )
+                    if match:
+                        queries = int(match.group(1))
+            except urllib.error.URLError:
+                failed = True
+            elapsed = (time.perf_counter() - request_started) * 1000
+            return elapsed, failed, queries
+
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            list(executor.map(fetch, range(options['warmup'])))
+            started = time.perf_counter()
+            samples = list(executor.map(fetch, range(options['requests'])))
+            elapsed = time.perf_counter() - started
+        return self.summary(
+            path,
+            [timing for timing, failed, _ in samples if not failed],
+            sum(failed for _, failed, _ in samples),
+            elapsed,
+            queries=max(
+                (count for _, _, count in samples if count is not None),
+                default=None,
+            ),
+        )
+
+    def report(self, name, result):
+        if not result['requests']:
+            print(
+                f'{name:<18} ни один запрос не выполнен, '
+                f'ошибок {result["errors"]}'
+            )
+            return
+        queries = result['queries']
+        print(
+            f'{name:<18} p50 {result["p50"]:8.2f} мс  '
+            f'p95 {result["p95"]:8.2f} мс  p99 {result["p99"]:8.2f} мс  '
+            f'{result["rps"]:8.1f} запр/с  '
+            f'запросов к базе {"-" if queries is None else queries}  '
+            f'ошибок {result["errors"]}'
+        )
+
+    def compare(self, results, path, threshold):
+        """Сравнение с предыдущим запуском, регрессии завершают команду"""
+        with open(path, encoding='utf-8') as file:
+            baseline = json.load(file)['endpoints']
+        regressions = []
+        for name, result in results['endpoints'].items():
+            previous = baseline.get(name)
+            if previous is None or None in (previous['p95'], result['p95']):
+                continue
+            if result['p95'] > previous['p95'] * (1 + threshold):
+                regressions.append(
+                    f'{name}: p95 {previous["p95"]:.2f} -> '
+                    f'{result["p95"]:.2f} мс'
+                )
+            if (
+                result['queries'] is not None
+                and previous.get('queries') is not None
+                and result['queries'] > previous['queries']
+            ):
+                regressions.append(
+                    f'{name}: запросов к базе {previous["queries"]} -> '
+                    f'{result["queries"]}'
+                )
+        if regressions:
+            raise CommandError(
+                'Найдены регрессии:\n' + '\n'.join(regressions)
+            )
+        print('Регрессий относительно', path, 'нет')
@@ -0,0 +1,90 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from api.renderers import ORJSONRenderer
+from api.serializers import (
+    ExpenseSerializer,
+    PaidSerializer,
+    UserSubscribeSerializer,
+    ValuesSerializer,
+)
+from services.models import Subscription
+
+SERIALIZERS = {
+    'subscriptions': (UserSubscribeSerializer, {}),
+    'expenses': (ExpenseSerializer, {}),
+    'paids': (PaidSerializer, {'end_date__isnull': False}),
+}
+
+
+class Command(BaseCommand):
+    """Команда для сравнения обычной и быстрой сериализации списков"""
+
+    help = (
+        'Проверяет, что быстрая сериализация из values() с рендерингом '
+        'orjson дает те же байты, что и сериализаторы DRF с JSONRenderer, '
+        'и замеряет процессорное время на один ответ. Запускается на '
+        'базе, заполненной командой seed_load.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=1000,
+            help='Количество записей в одном ответе',
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        host = next(
+            (host for host in settings.ALLOWED_HOSTS if host != '*'),
+            'localhost',
+        ).lstrip('.')
+        context = {'request': RequestFactory(HTTP_HOST=host).get('/')}
+        for name, (serializer_class, filters) in SERIALIZERS.items():
+            queryset = Subscription.objects.filter(
+                **filters
+            ).order_by('id')[:options['rows']]
+            fast = ValuesSerializer(serializer_class, context=context)
+
+            def regular():
+                return JSONRenderer().render(serializer_class(
+                    queryset.select_related(
+                        'service__category', 'terms', 'bank_card'
+                    ),
+                    many=True,
+                    context=context,
+                ).data)
+
+            def values():
+                return ORJSONRenderer().render(
+                    fast.to_representation(fast.values(queryset))
+                )
+
+            expected, actual = regular(), values()
+            if expected != actual:
+                raise CommandError(
+                    f'{name}: ответ быстрой сериализации отличается '
+                    f'от ответа {serializer_class.__name__}'
+                )
+            regular_time = self.measure(regular, options['repeat'])
+            values_time = self.measure(values, options['repeat'])
+            print(
+                f'{name:<14} записей {expected.count(b"{"):>5}  '
+                f'DRF {regular_time:8.2f} мс  '
+                f'values+orjson {values_time:8.2f} мс  '
+                f'экономия {regular_time - values_time:8.2f} мс '
+                f'({1 - values_time / regular_time:.0%})'
+            )
+
+    def measure(self, function, repeat):
+        """Процессорное время одного вызова в миллисекундах"""
+        started = time.process_time()
+        for _ in range(repeat):
+            function()
+        return (time.process_time() - started) / repeat * 1000
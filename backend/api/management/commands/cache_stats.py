@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from api.cache import catalog_cache_stats, main_page_cache_stats
+
+
+class Command(BaseCommand):
+    """Команда для вывода статистики кэша"""
+
+    help = 'Попадания и промахи кэша каталога и главной страницы'
+
+    def handle(self, *args, **kwargs):
+        stats = catalog_cache_stats()
+        stats['main_page'] = main_page_cache_stats()
+        for name, values in stats.items():
+            hits, misses = values['hits'], values['misses']
+            ratio = hits / (hits + misses) if hits + misses else 0
+            print(f'{name:<10} попаданий {hits:>8}  промахов {misses:>8}  '
+                  f'доля попаданий {ratio:.1%}')
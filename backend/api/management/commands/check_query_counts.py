@@ -0,0 +1,119 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.cache import invalidate_catalog, invalidate_main_page
+from api.tests.fixtures import create_api_data
+
+ROUTES = (
+    ('main', 'get', '/api/main/', None),
+    ('comparison', 'get', '/api/comparison/', None),
+    ('cards', 'get', '/api/cards/', None),
+    ('cards-activate', 'patch', '/api/cards/', {'card_id': '{card_id}'}),
+    ('categories-catalog', 'get', '/api/categories/catalog/', None),
+    ('services-list', 'get', '/api/services/', None),
+    ('services-search', 'get', '/api/services/?q={prefix}', None),
+    ('services-detail', 'get', '/api/services/{service_id}/', None),
+    ('services-best-offer', 'get', '/api/services/bestoffer/', None),
+    (
+        'services-term-detail',
+        'get',
+        '/api/services/{service_id}/terms/{terms_id}/',
+        None,
+    ),
+    (
+        'services-subscribe',
+        'post',
+        '/api/services/{new_service_id}/terms/{new_terms_id}/subscribe/',
+        {},
+    ),
+    (
+        'services-add-comparison',
+        'post',
+        '/api/services/{new_service_id}/add_comparison/',
+        None,
+    ),
+    ('users-subscriptions', 'get', '/api/user/subscriptions/', None),
+    ('users-cashback', 'get', '/api/user/cashback/', None),
+    ('users-expenses', 'get', '/api/user/expenses/', None),
+    ('users-paids', 'get', '/api/user/paids/', None),
+    ('users-calendar', 'get', '/api/user/calendar/?group=day', None),
+    ('users-me', 'get', '/api/user/profile/', None),
+)
+
+
+class Command(BaseCommand):
+    """Команда для проверки количества запросов к базе на эндпоинтах API"""
+
+    help = (
+        'Создает данные двух объемов, обходит все маршруты API и '
+        'проверяет, что количество запросов к базе не зависит от объема. '
+        'Все изменения откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            nargs=2,
+            type=int,
+            default=(10, 500),
+            metavar=('SMALL', 'LARGE'),
+            help='Количество связанных записей в малом и большом наборе',
+        )
+
+    def handle(self, *args, **options):
+        small, large = options['sizes']
+        with transaction.atomic():
+            counts_small = self.measure(create_api_data(small))
+            counts_large = self.measure(create_api_data(large))
+            transaction.set_rollback(True)
+
+        failures = []
+        for name, *_ in ROUTES:
+            small_count, small_status = counts_small[name]
+            large_count, large_status = counts_large[name]
+            mark = 'ok'
+            if max(small_status, large_status) >= 400:
+                mark = f'ошибка {small_status}/{large_status}'
+                failures.append(name)
+            elif small_count != large_count:
+                mark = 'рост'
+                failures.append(name)
+            print(f'{name:<24} {small_count:>4} {large_count:>4}  {mark}')
+        if failures:
+            raise CommandError(
+                'Количество запросов зависит от объема данных или '
+                'эндпоинт вернул ошибку: ' + ', '.join(failures)
+            )
+        print('Количество запросов не зависит от объема данных')
+
+    def measure(self, context):
+        """Количество запросов и код ответа каждого маршрута"""
+        host = next(
+            (host for host in settings.ALLOWED_HOSTS if host != '*'),
+            'localhost',
+        ).lstrip('.')
+        token = AccessToken.for_user(context['user'])
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {token}', HTTP_HOST=host)
+        results = {}
+        for name, method, path, data in ROUTES:
+            invalidate_catalog()
+            invalidate_main_page(context['user'].pk)
+            request = {'path': path.format(**context)}
+            if data is not None:
+                request['data'] = json.dumps({
+                    key: value.format(**context)
+                    for key, value in data.items()
+                })
+                request['content_type'] = 'application/json'
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(client, method)(**request)
+            results[name] = (
+                len(queries.captured_queries), response.status_code
+            )
+        return results
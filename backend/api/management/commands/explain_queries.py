@@ -0,0 +1,118 @@
+import datetime
+import re
+
+from django.db import connection
+from django.db.models import Count
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.filters import PaidFilter, SubscriptionFilter
+from services.models import BankCard, Subscription
+
+DATE_RANGE_INDEXES = {
+    'expenses': ('subscription_user_start_idx', 'start_date'),
+    'paids': ('subscription_user_end_idx', 'end_date'),
+}
+INDEX_RANGE_PATTERNS = {
+    'postgresql': r'Index Cond: .*\b{column}\b',
+    'sqlite': r'INDEX {index} \(.*\b{column}[<>]',
+}
+
+
+class Command(BaseCommand):
+    """Команда для вывода планов запросов к подпискам и картам"""
+
+    help = (
+        'Вывод планов выполнения основных запросов к подпискам. '
+        'Запускается на заполненной базе до и после миграций с индексами, '
+        'с --check проверяет, что фильтры по периоду идут по индексу.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            help='Пользователь для запросов, по умолчанию самый активный',
+        )
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='EXPLAIN ANALYZE с буферами (только PostgreSQL)',
+        )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Завершиться ошибкой, если условие на период подписок '
+                 'не выполняется по индексу',
+        )
+
+    def get_user_id(self, user_id):
+        if user_id:
+            return user_id
+        busiest = Subscription.objects.order_by().values('user').annotate(
+            total=Count('id')
+        ).order_by('-total').first()
+        if busiest is None:
+            raise CommandError('В базе нет подписок.')
+        return busiest['user']
+
+    def handle(self, *args, **options):
+        user_id = self.get_user_id(options['user'])
+        explain_options = {}
+        if connection.vendor == 'postgresql' and options['analyze']:
+            explain_options = {'analyze': True, 'buffers': True}
+
+        today = timezone.localdate()
+        month_start = today.replace(day=1)
+        year_ago = today - datetime.timedelta(days=365)
+        subscription = Subscription.objects.filter(user=user_id).first()
+        queries = {
+            'expenses': SubscriptionFilter(
+                {'start_date': year_ago, 'end_date': today},
+                queryset=Subscription.objects.filter(user=user_id),
+            ).qs,
+            'paids': PaidFilter(
+                {'start_date': month_start, 'end_date': today},
+                queryset=Subscription.objects.filter(
+                    user=user_id, end_date__isnull=False
+                ),
+            ).qs,
+            'active_card': BankCard.objects.filter(
+                user=user_id,
+                is_active=True,
+            ),
+        }
+        if subscription is not None:
+            queries['subscribe_unique'] = Subscription.objects.filter(
+                user=user_id,
+                service=subscription.service_id,
+                terms=subscription.terms_id,
+            )
+
+        failures = []
+        for name, queryset in queries.items():
+            plan = queryset.explain(**explain_options)
+            print(f'-- {name}')
+            print(plan)
+            print()
+            if name in DATE_RANGE_INDEXES and not self.uses_range_index(
+                plan, *DATE_RANGE_INDEXES[name]
+            ):
+                failures.append(name)
+
+        if options['check']:
+            if failures:
+                raise CommandError(
+                    'Условие на период выполняется без индекса: '
+                    + ', '.join(failures)
+                )
+            print('Условия на период подписок выполняются по индексу')
+
+    def uses_range_index(self, plan, index, column):
+        """В плане есть поиск по индексу с условием на колонку column"""
+        pattern = INDEX_RANGE_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            return True
+        return re.search(
+            pattern.format(index=index, column=column), plan
+        ) is not None
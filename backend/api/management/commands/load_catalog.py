@@ -0,0 +1,286 @@
+import csv
+import io
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.cache import invalidate_catalog, invalidate_main_page
+from PAY2U.settings import CSV_FILES_DIR
+from services.models import (
+    Category,
+    MonthlySpending,
+    Service,
+    Subscription,
+    Terms,
+)
+
+TRUE_VALUES = {'1', 'true', 'yes', 'да'}
+
+
+def read_rows(path):
+    """Построчное чтение CSV с заголовком или JSON lines"""
+    with open(path, encoding='utf-8', newline='') as file:
+        if path.suffix in ('.jsonl', '.json'):
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(file)
+
+
+def batches(rows, size):
+    """Разбиение потока строк на пачки фиксированного размера"""
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def copy_upsert(model, objs, unique_fields, update_fields):
+    """Загрузка пачки через COPY во временную таблицу и INSERT ON CONFLICT"""
+    quote = connection.ops.quote_name
+    fields = [
+        field for field in model._meta.concrete_fields
+        if not field.primary_key and not field.null
+    ]
+    columns = ', '.join(quote(field.column) for field in fields)
+    conflict = ', '.join(
+        quote(model._meta.get_field(name).column) for name in unique_fields
+    )
+    if update_fields:
+        action = 'UPDATE SET ' + ', '.join(
+            f'{column} = EXCLUDED.{column}' for column in (
+                quote(model._meta.get_field(name).column)
+                for name in update_fields
+            )
+        )
+    else:
+        action = 'NOTHING'
+    table = quote(model._meta.db_table)
+    temp_table = quote(f'{model._meta.db_table}_load')
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+    for obj in objs:
+        writer.writerow([
+            field.get_db_prep_save(field.pre_save(obj, True), connection)
+            for field in fields
+        ])
+    buffer.seek(0)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMP TABLE {temp_table} ON COMMIT DROP AS '
+            f'SELECT {columns} FROM {table} WITH NO DATA'
+        )
+        cursor.copy_expert(
+            f'COPY {temp_table} ({columns}) FROM STDIN WITH (FORMAT csv)',
+            buffer,
+        )
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) '
+            f'SELECT {columns} FROM {temp_table} '
+            f'ON CONFLICT ({conflict}) DO {action}'
+        )
+
+
+class Command(BaseCommand):
+    """Команда для загрузки каталога категорий, сервисов и тарифов"""
+
+    help = 'Потоковая загрузка каталога с обновлением существующих записей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--categories',
+            help='CSV или JSON lines с полем name',
+        )
+        parser.add_argument(
+            '--services',
+            help='CSV или JSON lines с полями name, category, text, '
+                 'image, is_featured',
+        )
+        parser.add_argument(
+            '--terms',
+            help='CSV или JSON lines с полями service, name, '
+                 'subscription_type, duration, price, cashback',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Количество строк в одной пачке',
+        )
+        parser.add_argument(
+            '--copy',
+            action='store_true',
+            help='Загружать пачки через COPY (только PostgreSQL)',
+        )
+
+    def handle(self, *args, **options):
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('COPY доступен только для PostgreSQL')
+        self.batch_size = options['batch_size']
+        self.use_copy = options['copy']
+        paths = {
+            name: options[name] for name in ('categories', 'services', 'terms')
+        }
+        if not any(paths.values()):
+            paths = {
+                'categories': f'{CSV_FILES_DIR}/categorys.csv',
+                'services': f'{CSV_FILES_DIR}/services.csv',
+                'terms': f'{CSV_FILES_DIR}/terms.csv',
+            }
+            paths = {
+                name: path for name, path in paths.items()
+                if Path(path).exists()
+            }
+
+        self.category_ids = dict(
+            Category.objects.values_list('name', 'id')
+        )
+        self.service_ids = dict(Service.objects.values_list('name', 'id'))
+        self.touched_service_ids = set()
+
+        if paths.get('categories'):
+            self.load(
+                'Category', Path(paths['categories']), self.load_categories
+            )
+        if paths.get('services'):
+            self.load('Service', Path(paths['services']), self.load_services)
+        if paths.get('terms'):
+            self.load('Terms', Path(paths['terms']), self.load_terms)
+        self.refresh_services()
+
+    def load(self, label, path, load_batch):
+        """Загрузка файла пачками с отчетом о скорости"""
+        started = time.monotonic()
+        loaded = skipped = 0
+        for batch in batches(read_rows(path), self.batch_size):
+            with transaction.atomic():
+                count = load_batch(batch)
+            loaded += count
+            skipped += len(batch) - count
+        elapsed = time.monotonic() - started
+        print(
+            f'ADD {loaded} {label} за {elapsed:.2f} с '
+            f'({loaded / elapsed if elapsed else loaded:.0f} строк/с)'
+        )
+        if skipped:
+            print(f'Пропущено {skipped} {label}: не найдена связанная запись')
+
+    def upsert(self, model, objs, unique_fields, update_fields):
+        """Вставка пачки с обновлением записей по естественному ключу.
+
+        Поля передаются именами столбцов: Django 4.1 подставляет их в
+        ON CONFLICT без преобразования.
+        """
+        if self.use_copy:
+            copy_upsert(model, objs, unique_fields, update_fields)
+        elif update_fields:
+            model.objects.bulk_create(
+                objs,
+                update_conflicts=True,
+                unique_fields=unique_fields,
+                update_fields=update_fields,
+            )
+        else:
+            model.objects.bulk_create(objs, ignore_conflicts=True)
+        return len(objs)
+
+    def load_categories(self, rows):
+        names = {row['name'].strip() for row in rows}
+        self.upsert(
+            Category, [Category(name=name) for name in names], ['name'], []
+        )
+        self.category_ids.update(
+            Category.objects.filter(name__in=names).values_list('name', 'id')
+        )
+        return len(rows)
+
+    def load_services(self, rows):
+        update_fields = ['category_id', 'text', 'is_featured', 'updated_at']
+        if 'image' in rows[0]:
+            update_fields.append('image')
+        services = {}
+        for row in rows:
+            category_id = self.category_ids.get(row['category'].strip())
+            if category_id is None:
+                continue
+            name = row['name'].strip()
+            services[name] = Service(
+                name=name,
+                category_id=category_id,
+                text=row.get('text', ''),
+                image=row.get('image', ''),
+                is_featured=str(
+                    row.get('is_featured', '')
+                ).strip().lower() in TRUE_VALUES,
+            )
+        self.upsert(Service, list(services.values()), ['name'], update_fields)
+        loaded = dict(
+            Service.objects.filter(
+                name__in=services
+            ).values_list('name', 'id')
+        )
+        self.service_ids.update(loaded)
+        self.touched_service_ids.update(loaded.values())
+        return sum(
+            self.category_ids.get(row['category'].strip()) is not None
+            for row in rows
+        )
+
+    def load_terms(self, rows):
+        terms = {}
+        for row in rows:
+            service_id = self.service_ids.get(row['service'].strip())
+            if service_id is None:
+                continue
+            name = row['name'].strip()
+            terms[service_id, name] = Terms(
+                service_id=service_id,
+                name=name,
+                subscription_type=row.get('subscription_type') or 'free',
+                duration=row['duration'],
+                price=int(row['price']),
+                cashback=int(row['cashback']),
+            )
+        self.upsert(
+            Terms,
+            list(terms.values()),
+            ['service_id', 'name'],
+            [
+                'subscription_type', 'duration', 'price', 'cashback',
+                'updated_at',
+            ],
+        )
+        self.touched_service_ids.update(
+            service_id for service_id, name in terms
+        )
+        return sum(
+            self.service_ids.get(row['service'].strip()) is not None
+            for row in rows
+        )
+
+    def refresh_services(self):
+        """Обновление производных данных, которые ведут сигналы моделей.
+
+        Пакетная вставка не вызывает сигналы, поэтому сводки тарифов,
+        поисковые векторы, помесячные расходы подписчиков и кэш главной
+        страницы пересчитываются здесь для затронутых сервисов.
+        """
+        service_ids = sorted(self.touched_service_ids)
+        for batch in batches(service_ids, self.batch_size):
+            services = Service.objects.filter(pk__in=batch)
+            services.refresh_terms_summary()
+            services.refresh_search_vector()
+            user_ids = Subscription.objects.filter(
+                service__in=batch
+            ).order_by().values_list('user', flat=True).distinct()
+            for users in batches(user_ids.iterator(), self.batch_size):
+                MonthlySpending.objects.rebuild(user_ids=users)
+        invalidate_catalog()
+        invalidate_main_page()
+        print('Каталог в базу данных загружен')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from api.idempotency import prune_expired
+
+
+class Command(BaseCommand):
+    """Команда для удаления просроченных ключей идемпотентности"""
+
+    help = (
+        'Удаление просроченных ключей идемпотентности. Обработчик очереди '
+        'run_worker удаляет их сам каждые IDEMPOTENCY_PRUNE_SECONDS '
+        'секунд, команда нужна для разового запуска.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Количество ключей, удаляемых одним запросом',
+        )
+
+    def handle(self, *args, **options):
+        total = prune_expired(options['batch_size'])
+        print('Просроченные ключи идемпотентности удалены')
+        print('DELETE', total, 'IdempotencyKey')
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from services.models import MonthlySpending
+from users.models import User
+
+
+class Command(BaseCommand):
+    """Команда для пересчета помесячной сводки расходов"""
+
+    help = 'Пересчет помесячной сводки расходов пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество пользователей в одном пересчете',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        user_ids = User.objects.order_by('id').values_list('id', flat=True)
+        total = 0
+        batch = []
+        for user_id in user_ids.iterator(chunk_size=batch_size):
+            batch.append(user_id)
+            if len(batch) == batch_size:
+                total += MonthlySpending.objects.rebuild(user_ids=batch)
+                batch = []
+        if batch:
+            total += MonthlySpending.objects.rebuild(user_ids=batch)
+        print('Помесячная сводка расходов пересчитана')
+        print('ADD', total, 'MonthlySpending')
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.cache import invalidate_catalog
+from services.models import Service
+
+
+class Command(BaseCommand):
+    """Команда для пересчета сводных цен и кэшбэка сервисов"""
+
+    help = 'Пересчет минимальной цены и максимального кэшбэка сервисов'
+
+    def handle(self, *args, **kwargs):
+        updated = Service.objects.all().refresh_terms_summary()
+        invalidate_catalog()
+        print('Сводные данные сервисов пересчитаны')
+        print('UPDATE', updated, 'Service')
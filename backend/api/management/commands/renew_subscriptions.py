@@ -0,0 +1,79 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from api.renewals import renew_due
+
+
+class Command(BaseCommand):
+    """Команда для продления подписок, срок которых подошел"""
+
+    help = (
+        'Продлевает подписки со сроком продления до --cutoff: списывает '
+        'стоимость периода с карты и записывает следующий период новой '
+        'подпиской. Пачки захватываются с SKIP LOCKED, поэтому можно '
+        'запускать несколько процессов одновременно. С --loop работает '
+        'постоянно.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cutoff',
+            help='Продлевать подписки со сроком до этого момента '
+                 '(ISO 8601), по умолчанию текущее время',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            help='Остановиться после указанного количества пачек',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Не завершаться, проверять очередь каждые --sleep секунд',
+        )
+        parser.add_argument('--sleep', type=float, default=10)
+
+    def get_cutoff(self, value):
+        if value is None:
+            return timezone.now()
+        cutoff = parse_datetime(value)
+        if cutoff is None:
+            raise CommandError(f'Неверная дата --cutoff: {value}')
+        if timezone.is_naive(cutoff):
+            cutoff = timezone.make_aware(cutoff)
+        return cutoff
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            total = renew_due(
+                self.get_cutoff(options['cutoff']),
+                options['batch_size'],
+                options['max_batches'],
+                report=lambda number, result, seconds: self.report(
+                    f'пачка {number}', result, seconds
+                ),
+            )
+            elapsed = time.perf_counter() - started
+            if total['claimed']:
+                self.report('итого', total, elapsed)
+            if not options['loop']:
+                break
+            if not total['claimed']:
+                time.sleep(options['sleep'])
+
+    def report(self, label, result, seconds):
+        """Счетчики и пропускная способность пачки или всего запуска"""
+        rate = result['claimed'] / seconds if seconds else 0
+        print(
+            f'{label}: захвачено {result["claimed"]}, '
+            f'продлено {result["renewed"]}, '
+            f'отложено {result["failed"]}, '
+            f'прекращено {result["expired"]}, '
+            f'{seconds * 1000:.0f} мс, {rate:.0f} подписок/с, '
+            f'{rate * 3600:.0f} подписок/ч'
+        )
@@ -0,0 +1,67 @@
+import signal
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import autodiscover_modules
+
+from api.tasks import TASKS, enqueue_once, prune_idempotency_keys, work
+
+
+class Command(BaseCommand):
+    """Команда для выполнения фоновых задач из очереди в базе данных"""
+
+    help = (
+        'Выполняет фоновые задачи из таблицы очереди в --threads потоков. '
+        'Задачи захватываются с SKIP LOCKED, поэтому можно запускать '
+        'несколько обработчиков одновременно. SIGTERM и SIGINT '
+        'останавливают обработчик после выполнения текущих задач. При '
+        'запуске ставится периодическое удаление просроченных ключей '
+        'идемпотентности.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=1,
+            help='Пауза между проверками пустой очереди в секундах',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Завершиться, как только очередь опустеет',
+        )
+
+    def handle(self, *args, **options):
+        autodiscover_modules('tasks')
+        enqueue_once(prune_idempotency_keys)
+        stop = threading.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *args: stop.set())
+        print(
+            f'Обработчик запущен, потоков {options["threads"]}, '
+            f'задач {len(TASKS)}: {", ".join(sorted(TASKS))}'
+        )
+        started = time.perf_counter()
+        with ThreadPoolExecutor(
+            options['threads'], thread_name_prefix='worker'
+        ) as executor:
+            futures = [
+                executor.submit(
+                    work, stop, options['sleep'], options['once']
+                )
+                for _ in range(options['threads'])
+            ]
+            total = Counter()
+            for future in futures:
+                total.update(future.result())
+        elapsed = time.perf_counter() - started
+        print(
+            f'Обработчик остановлен: выполнено {total["done"]}, '
+            f'отложено {total["retried"]}, с ошибкой {total["failed"]}, '
+            f'{elapsed:.1f} с'
+        )
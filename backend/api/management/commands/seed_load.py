@@ -0,0 +1,387 @@
+import csv
+import datetime
+import io
+import random
+import time
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api.cache import invalidate_catalog, invalidate_main_page
+from services.models import (
+    BankCard,
+    Category,
+    Comparison,
+    MonthlySpending,
+    Service,
+    Subscription,
+    Terms,
+)
+from users.models import User
+
+CATEGORY_NAMES = ('Кино', 'Музыка', 'Литература', 'Путешесвия', 'Обучение')
+
+# Цена тарифа указана за 30 дней, длинные тарифы дешевле на процент
+# скидки.
+TERMS_VARIANTS = (
+    ('Месяц', 'one_month', 0),
+    ('Три месяца', 'three_months', 5),
+    ('Полгода', 'six_months', 10),
+    ('Год', 'one_year', 20),
+)
+
+
+class Command(BaseCommand):
+    """Команда для генерации нагрузочных данных"""
+
+    help = (
+        'Генерация пользователей, карт, сервисов, тарифов, подписок и '
+        'сравнений в объемах продакшена'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--services', type=int, default=1000)
+        parser.add_argument(
+            '--subscriptions',
+            type=int,
+            default=100000,
+            help='Примерное общее количество подписок',
+        )
+        parser.add_argument('--comparisons', type=int, default=20000)
+        parser.add_argument(
+            '--max-cards',
+            type=int,
+            default=3,
+            help='Максимум банковских карт у пользователя',
+        )
+        parser.add_argument(
+            '--years',
+            type=int,
+            default=3,
+            help='За сколько лет распределяются даты начала подписок',
+        )
+        parser.add_argument(
+            '--zipf',
+            type=float,
+            default=1.1,
+            help='Показатель распределения популярности сервисов',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--anchor',
+            type=datetime.date.fromisoformat,
+            help=(
+                'Дата ГГГГ-ММ-ДД, от которой отсчитываются даты подписок, '
+                'по умолчанию сегодня'
+            ),
+        )
+        parser.add_argument('--password', default='password')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument(
+            '--copy',
+            action='store_true',
+            help='Загружать пачки через COPY (только PostgreSQL)',
+        )
+        parser.add_argument(
+            '--skip-spending',
+            action='store_true',
+            help='Не пересчитывать помесячную сводку расходов',
+        )
+
+    def handle(self, *args, **options):
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('COPY доступен только для PostgreSQL')
+        self.options = options
+        self.batch_size = options['batch_size']
+        self.random = random.Random(options['seed'])
+        self.prefix = f'load{options["seed"]}_'
+        if User.objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(
+                f'Данные с префиксом {self.prefix} уже созданы, '
+                'укажите другой --seed'
+            )
+        self.now = timezone.make_aware(datetime.datetime.combine(
+            options['anchor'] or timezone.localdate(), datetime.time()
+        ))
+
+        category_ids = self.seed_categories()
+        user_ids = self.seed_users()
+        cards = self.seed_cards(user_ids)
+        service_ids = self.seed_services(category_ids)
+        terms = self.seed_terms(service_ids)
+        self.seed_subscriptions(user_ids, cards, service_ids, terms)
+        self.seed_comparisons(user_ids, service_ids)
+
+        services = Service.objects.filter(name__startswith=self.prefix)
+        services.refresh_terms_summary()
+        services.refresh_search_vector()
+        if not options['skip_spending']:
+            self.timed(
+                'MonthlySpending', lambda: self.rebuild_spending(user_ids)
+            )
+        invalidate_catalog()
+        invalidate_main_page()
+        print(
+            f'Нагрузочные данные созданы: пользователи {self.prefix}N'
+            f'@example.com, пароль {options["password"]}'
+        )
+
+    def popularity(self, count):
+        """Накопленные веса Zipf-подобной популярности по рангу"""
+        return list(accumulate(
+            1 / rank ** self.options['zipf'] for rank in range(1, count + 1)
+        ))
+
+    def write(self, model, fields, rows):
+        """Пакетная запись кортежей значений в таблицу модели"""
+        total = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == self.batch_size:
+                total += self.write_batch(model, fields, batch)
+                batch = []
+        if batch:
+            total += self.write_batch(model, fields, batch)
+        return total
+
+    def write_batch(self, model, fields, rows):
+        """Запись пачки через bulk_create или COPY.
+
+        Для COPY передаются все обязательные столбцы: значения по умолчанию
+        и даты изменения Django не попадают в схему базы.
+        """
+        with transaction.atomic():
+            if not self.options['copy']:
+                model.objects.bulk_create(
+                    model(**dict(zip(fields, row))) for row in rows
+                )
+                return len(rows)
+            quote = connection.ops.quote_name
+            model_fields = [model._meta.get_field(name) for name in fields]
+            auto_fields = [
+                field for field in model._meta.concrete_fields
+                if getattr(field, 'auto_now', False)
+                and field not in model_fields
+            ]
+            model_fields += auto_fields
+            rows = [(*row, *[self.now] * len(auto_fields)) for row in rows]
+            columns = ', '.join(quote(field.column) for field in model_fields)
+            nullable = ', '.join(
+                quote(field.column) for field in model_fields if field.null
+            )
+            buffer = io.StringIO()
+            csv.writer(buffer, quoting=csv.QUOTE_ALL).writerows(rows)
+            buffer.seek(0)
+            with connection.cursor() as cursor:
+                cursor.copy_expert(
+                    f'COPY {quote(model._meta.db_table)} ({columns}) '
+                    'FROM STDIN WITH (FORMAT csv'
+                    f'{f", FORCE_NULL ({nullable})" if nullable else ""})',
+                    buffer,
+                )
+        return len(rows)
+
+    def timed(self, label, run):
+        """Вывод количества строк и скорости записи"""
+        started = time.monotonic()
+        count = run()
+        elapsed = time.monotonic() - started
+        print(
+            f'ADD {count} {label} за {elapsed:.2f} с '
+            f'({count / elapsed if elapsed else count:.0f} строк/с)'
+        )
+
+    def seeded_ids(self, queryset):
+        return list(queryset.order_by('id').values_list('id', flat=True))
+
+    def seed_categories(self):
+        existing = set(Category.objects.values_list('name', flat=True))
+        missing = [name for name in CATEGORY_NAMES if name not in existing]
+        if missing:
+            Category.objects.bulk_create(
+                Category(name=name) for name in missing
+            )
+        return self.seeded_ids(Category.objects.all())
+
+    def seed_users(self):
+        password = make_password(self.options['password'])
+        self.timed('User', lambda: self.write(
+            User,
+            ('username', 'email', 'password', 'first_name', 'last_name',
+             'phone_number', 'is_active', 'is_staff', 'is_superuser',
+             'date_joined'),
+            (
+                (
+                    f'{self.prefix}{index}',
+                    f'{self.prefix}{index}@example.com',
+                    password,
+                    'Иван',
+                    'Петров',
+                    f'+7{self.random.randrange(9000000000, 9999999999)}',
+                    True,
+                    False,
+                    False,
+                    self.now,
+                )
+                for index in range(self.options['users'])
+            ),
+        ))
+        return self.seeded_ids(
+            User.objects.filter(username__startswith=self.prefix)
+        )
+
+    def seed_cards(self, user_ids):
+        counts = [
+            self.random.randint(1, self.options['max_cards'])
+            for _ in user_ids
+        ]
+        self.timed('BankCard', lambda: self.write(
+            BankCard,
+            ('card_number', 'user_id', 'balance', 'is_active'),
+            (
+                (
+                    f'{self.random.randrange(10 ** 15, 10 ** 16)}',
+                    user_id,
+                    self.random.randrange(0, 50000),
+                    number == 0,
+                )
+                for user_id, count in zip(user_ids, counts)
+                for number in range(count)
+            ),
+        ))
+        if not user_ids:
+            return []
+        card_ids = iter(self.seeded_ids(BankCard.objects.filter(
+            user_id__gte=user_ids[0], user_id__lte=user_ids[-1]
+        )))
+        return [
+            [next(card_ids) for _ in range(count)] for count in counts
+        ]
+
+    def seed_services(self, category_ids):
+        self.timed('Service', lambda: self.write(
+            Service,
+            ('name', 'category_id', 'image', 'text', 'is_featured',
+             'min_price', 'max_cashback'),
+            (
+                (
+                    f'{self.prefix}service_{index}',
+                    self.random.choice(category_ids),
+                    '',
+                    f'Сервис номер {index} для нагрузочного тестирования',
+                    index < 10,
+                    0,
+                    0,
+                )
+                for index in range(self.options['services'])
+            ),
+        ))
+        return self.seeded_ids(
+            Service.objects.filter(name__startswith=self.prefix)
+        )
+
+    def seed_terms(self, service_ids):
+        plans = []
+        for service_id in service_ids:
+            base = self.random.randrange(99, 1500)
+            cashback = self.random.randrange(0, 30)
+            variants = TERMS_VARIANTS[:self.random.randint(1, 4)]
+            plans.append([
+                (
+                    name, 'paid', duration,
+                    base * (100 - discount) // 100, cashback,
+                )
+                for name, duration, discount in variants
+            ])
+        self.timed('Terms', lambda: self.write(
+            Terms,
+            ('service_id', 'name', 'subscription_type', 'duration',
+             'price', 'cashback'),
+            (
+                (service_id, *plan)
+                for service_id, service_plans in zip(service_ids, plans)
+                for plan in service_plans
+            ),
+        ))
+        terms_ids = iter(self.seeded_ids(
+            Terms.objects.filter(service__name__startswith=self.prefix)
+        ))
+        return [
+            [
+                (next(terms_ids), Terms.DURATION_DAYS[plan[2]])
+                for plan in service_plans
+            ]
+            for service_plans in plans
+        ]
+
+    def seed_subscriptions(self, user_ids, cards, service_ids, terms):
+        weights = self.popularity(len(service_ids))
+        average = self.options['subscriptions'] / max(len(user_ids), 1)
+        span = self.options['years'] * 365 * 24 * 3600
+
+        def rows():
+            for user_id, user_cards in zip(user_ids, cards):
+                count = min(
+                    round(self.random.expovariate(1 / average))
+                    if average else 0,
+                    len(service_ids),
+                )
+                chosen = set(self.random.choices(
+                    range(len(service_ids)), cum_weights=weights, k=count
+                ))
+                for index in sorted(chosen):
+                    terms_id, days = self.random.choice(terms[index])
+                    start_date = self.now - datetime.timedelta(
+                        seconds=self.random.randrange(span)
+                    )
+                    end_date = start_date + datetime.timedelta(days=days)
+                    # Как миграция 0010: продлеваются только подписки,
+                    # которые еще не закончились.
+                    renew_at = end_date if end_date >= self.now else None
+                    yield (
+                        user_id,
+                        service_ids[index],
+                        terms_id,
+                        start_date,
+                        end_date,
+                        self.random.choice(user_cards),
+                        renew_at,
+                        0,
+                        '',
+                    )
+
+        self.timed('Subscription', lambda: self.write(
+            Subscription,
+            ('user_id', 'service_id', 'terms_id', 'start_date', 'end_date',
+             'bank_card_id', 'renew_at', 'renewal_attempts', 'renewal_error'),
+            rows(),
+        ))
+
+    def seed_comparisons(self, user_ids, service_ids):
+        weights = self.popularity(len(service_ids))
+        self.timed('Comparison', lambda: self.write(
+            Comparison,
+            ('user_id', 'service_id'),
+            (
+                (
+                    self.random.choice(user_ids),
+                    service_ids[self.random.choices(
+                        range(len(service_ids)), cum_weights=weights
+                    )[0]],
+                )
+                for _ in range(self.options['comparisons'])
+            ),
+        ))
+
+    def rebuild_spending(self, user_ids):
+        total = 0
+        for start in range(0, len(user_ids), self.batch_size):
+            total += MonthlySpending.objects.rebuild(
+                user_ids=user_ids[start:start + self.batch_size]
+            )
+        return total
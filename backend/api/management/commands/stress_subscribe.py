@@ -0,0 +1,122 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from api.utils import SubscribeError, create_subscription
+from services.models import BankCard, Category, Service, Terms
+from users.models import User
+
+
+class Command(BaseCommand):
+    """Нагрузочная проверка параллельного оформления подписок"""
+
+    help = (
+        'Параллельное оформление подписок одним пользователем с одной '
+        'карты. Проверяет, что баланс карты не уходит в минус, и выводит '
+        'пропускную способность. Созданные данные удаляются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help='Количество параллельных потоков',
+        )
+        parser.add_argument(
+            '--attempts',
+            type=int,
+            default=200,
+            help='Количество попыток подписки',
+        )
+        parser.add_argument(
+            '--affordable',
+            type=int,
+            default=50,
+            help='На сколько подписок хватает баланса карты',
+        )
+        parser.add_argument(
+            '--price',
+            type=int,
+            default=100,
+            help='Цена тарифа',
+        )
+
+    def subscribe(self, user, service, terms, bank_card):
+        try:
+            create_subscription(
+                user, service, terms, bank_card, timezone.now()
+            )
+            return 'created'
+        except SubscribeError:
+            return 'rejected'
+        except Exception as error:
+            return type(error).__name__
+        finally:
+            connection.close()
+
+    def handle(self, *args, **options):
+        attempts = options['attempts']
+        price = options['price']
+        suffix = uuid.uuid4().hex[:12]
+
+        category = Category.objects.create(name=f'stress_{suffix}')
+        user = User.objects.create(
+            email=f'stress_{suffix}@example.com',
+            username=f'stress_{suffix}',
+        )
+        try:
+            service = Service.objects.create(
+                name=f'stress_{suffix}',
+                category=category,
+                image='services/images/stress.png',
+                text='Нагрузочная проверка',
+            )
+            terms_list = Terms.objects.bulk_create(
+                Terms(
+                    name=f'stress_{number}',
+                    duration='one_month',
+                    price=price,
+                    cashback=0,
+                    service=service,
+                )
+                for number in range(attempts)
+            )
+            initial_balance = price * options['affordable']
+            bank_card = BankCard.objects.create(
+                user=user,
+                card_number='0000000000000000',
+                balance=initial_balance,
+                is_active=True,
+            )
+            started = time.monotonic()
+            with ThreadPoolExecutor(options['threads']) as executor:
+                results = list(executor.map(
+                    lambda terms: self.subscribe(
+                        user, service, terms, bank_card
+                    ),
+                    terms_list,
+                ))
+            elapsed = time.monotonic() - started
+
+            bank_card.refresh_from_db()
+            created = user.subscriptions.count()
+            outcome = {
+                result: results.count(result) for result in set(results)
+            }
+            print('Результаты:', outcome)
+            print(f'Подписок создано: {created} из {attempts}')
+            print(f'Баланс: {initial_balance} -> {bank_card.balance}')
+            print(f'Время: {elapsed:.2f} с, {attempts / elapsed:.1f} попыток/с')
+            if bank_card.balance != initial_balance - created * price:
+                raise CommandError('Баланс не совпадает с подписками.')
+            if created > options['affordable']:
+                raise CommandError('Карта ушла в минус.')
+            print('Перерасхода нет')
+        finally:
+            user.delete()
+            category.delete()
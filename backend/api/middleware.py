@@ -0,0 +1,196 @@
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from PAY2U.routers import (
+    SAFE_METHODS,
+    pin_to_primary,
+    request_routing,
+    request_user_id,
+)
+from .timing import serializer_timing
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDERS = re.compile(r'%s(?:\s*,\s*%s)+')
+
+
+class QueryBudgetExceeded(Exception):
+    """Представление выполнило больше запросов, чем ему разрешено"""
+
+
+class QueryCollector:
+    """Обертка выполнения запросов, собирающая их количество и время.
+
+    Время запросов, выполненных во время сериализации, дополнительно
+    записывается в timer.
+    """
+
+    def __init__(self, timer=None):
+        self.timer = timer
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.duration += elapsed
+            if self.timer is not None and self.timer.depth:
+                self.timer.db_duration += elapsed
+            self.count += 1
+            statement = PLACEHOLDERS.sub('%s...', sql)
+            fingerprint = hashlib.md5(statement.encode()).hexdigest()[:12]
+            self.fingerprints[fingerprint] += 1
+            self.statements.setdefault(fingerprint, statement)
+
+    def duplicates(self):
+        """Запросы, выполненные больше одного раза, начиная с частых"""
+        return [
+            {
+                'fingerprint': fingerprint,
+                'count': count,
+                'sql': self.statements[fingerprint][:300],
+            }
+            for fingerprint, count in self.fingerprints.most_common()
+            if count > 1
+        ]
+
+
+class QueryInstrumentationMiddleware:
+    """Учет запросов к базе и времени обработки запроса.
+
+    Для доли запросов QUERY_INSTRUMENTATION_SAMPLE_RATE считает количество
+    и время SQL-запросов, повторяющиеся запросы, время сериализаторов
+    (serializer), остальное время представления (app) и время рендеринга
+    ответа (render). Время базы не входит ни в serializer, ни в app, в том
+    числе для запросов, выполненных во время сериализации. Результат
+    отдается в заголовке Server-Timing и пишется в лог одной JSON-строкой.
+    Для представлений из QUERY_BUDGETS превышение числа запросов пишется в
+    лог с уровнем WARNING или, при QUERY_BUDGET_ACTION = 'raise',
+    завершает запрос исключением QueryBudgetExceeded.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.QUERY_INSTRUMENTATION_SAMPLE_RATE:
+            return self.get_response(request)
+
+        request._instrumented = True
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            timer = stack.enter_context(serializer_timing())
+            collector = QueryCollector(timer)
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(collector))
+            response = self.get_response(request)
+        finished = time.perf_counter()
+        total = finished - started
+        view_started = getattr(request, '_view_started', None)
+        render_started = getattr(request, '_render_started', None)
+        render_finished = getattr(request, '_render_finished', None)
+        app_time = render_time = None
+        serializer_time = timer.duration - timer.db_duration
+        if render_started is not None and render_finished is not None:
+            render_time = render_finished - render_started
+        if view_started is not None:
+            view_finished = render_started or finished
+            app_time = (
+                view_finished - view_started - collector.duration
+                - serializer_time
+            )
+
+        timings = [
+            f'db;dur={collector.duration * 1000:.1f};'
+            f'desc="{collector.count} queries"',
+            f'total;dur={total * 1000:.1f}',
+        ]
+        if app_time is not None:
+            timings.append(f'app;dur={app_time * 1000:.1f}')
+        timings.append(f'serializer;dur={serializer_time * 1000:.1f}')
+        if render_time is not None:
+            timings.append(f'render;dur={render_time * 1000:.1f}')
+        duplicates = collector.duplicates()
+        if duplicates:
+            timings.append(f'dup;desc="{len(duplicates)} duplicated"')
+        response['Server-Timing'] = ', '.join(timings)
+
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        record = {
+            'view': view_name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': collector.count,
+            'db_ms': round(collector.duration * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+            'app_ms': None if app_time is None else round(app_time * 1000, 1),
+            'serializer_ms': round(serializer_time * 1000, 1),
+            'render_ms': (
+                None if render_time is None else round(render_time * 1000, 1)
+            ),
+            'duplicates': duplicates,
+        }
+        logger.info(json.dumps(record, ensure_ascii=False))
+
+        budget = settings.QUERY_BUDGETS.get(view_name)
+        if budget is not None and collector.count > budget:
+            message = (
+                f'{view_name}: {collector.count} запросов к базе '
+                f'при бюджете {budget}'
+            )
+            if settings.QUERY_BUDGET_ACTION == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        """Отмечает начало и конец рендеринга ответа DRF"""
+        if not getattr(request, '_instrumented', False):
+            return response
+        request._render_started = time.perf_counter()
+        response.add_post_render_callback(
+            lambda rendered: setattr(
+                request, '_render_finished', time.perf_counter()
+            )
+        )
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """Включает чтение с реплик для HTTP-запроса.
+
+    После успешного изменяющего запроса пользователь на
+    REPLICA_PIN_SECONDS закрепляется за основной базой, чтобы сразу видеть
+    свои изменения, пока реплики их догоняют.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with request_routing(request):
+            response = self.get_response(request)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            user_id = request_user_id(request)
+            if user_id is not None:
+                pin_to_primary(user_id)
+        return response
@@ -0,0 +1,135 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+from users.models import User
+
+
+class IdempotencyKey(models.Model):
+    """Сохраненный ответ на запрос с заголовком Idempotency-Key"""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys',
+        verbose_name='Пользователь',
+    )
+    key = models.CharField(
+        max_length=255,
+        verbose_name='Ключ идемпотентности'
+    )
+    request = models.CharField(
+        max_length=255,
+        verbose_name='Метод и путь запроса'
+    )
+    status_code = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Код ответа'
+    )
+    response = models.JSONField(
+        null=True,
+        encoder=DjangoJSONEncoder,
+        verbose_name='Тело ответа'
+    )
+    expires_at = models.DateTimeField(
+        db_index=True,
+        verbose_name='Срок хранения'
+    )
+
+    class Meta:
+        verbose_name = 'Ключ идемпотентности'
+        verbose_name_plural = 'Ключи идемпотентности'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'key'),
+                name='unique_user_idempotency_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.key} пользователя {self.user_id}'
+
+
+class TaskQuerySet(models.QuerySet):
+
+    def ready(self, now=None):
+        """Задачи, которые можно захватить: срок выполнения наступил, а
+        у выполняемых истекла аренда"""
+        return self.filter(
+            status__in=(Task.QUEUED, Task.RUNNING),
+            run_at__lte=now or timezone.now(),
+        )
+
+
+class Task(models.Model):
+    """Фоновая задача в очереди"""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Завершилась ошибкой'),
+    )
+
+    name = models.CharField(
+        max_length=255,
+        verbose_name='Имя задачи'
+    )
+    kwargs = models.JSONField(
+        default=dict,
+        encoder=DjangoJSONEncoder,
+        verbose_name='Аргументы'
+    )
+    priority = models.SmallIntegerField(
+        default=0,
+        verbose_name='Приоритет'
+    )
+    status = models.CharField(
+        max_length=16,
+        choices=STATUSES,
+        default=QUEUED,
+        verbose_name='Статус'
+    )
+    run_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Выполнить не раньше'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток выполнения'
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        verbose_name='Максимум попыток'
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name='Последняя ошибка'
+    )
+    locked_by = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name='Обработчик'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата постановки в очередь'
+    )
+
+    objects = TaskQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = [
+            models.Index(
+                fields=('-priority', 'run_at'),
+                condition=Q(status__in=('queued', 'running')),
+                name='task_ready_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
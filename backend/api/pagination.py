@@ -0,0 +1,81 @@
+from rest_framework.pagination import CursorPagination
+
+from .filters import ServiceSearchFilter
+
+
+class KeysetPagination(CursorPagination):
+    """Курсорная пагинация по индексируемым полям.
+
+    Страница выбирается условием на ключ сортировки вместо OFFSET и
+    без COUNT(*), поэтому дальние страницы стоят столько же, сколько
+    первая. Идентификатор добавляется в конец сортировки, чтобы порядок
+    записей с одинаковым ключом был однозначным.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not {'id', '-id', 'pk', '-pk'} & set(ordering):
+            ordering += ('id',)
+        return ordering
+
+
+class ServiceCursorPagination(KeysetPagination):
+    """Пагинация сервисов по названию или по рангу поиска"""
+
+    ordering = ('name', 'id')
+
+    def get_ordering(self, request, queryset, view):
+        searching = request.query_params.get(
+            ServiceSearchFilter.search_param, ''
+        ).strip()
+        if searching and not request.query_params.get('ordering'):
+            return ('-rank', 'id')
+        return super().get_ordering(request, queryset, view)
+
+
+class TotalKeysetPagination(KeysetPagination):
+    """Курсорная пагинация с итогом по всей выборке.
+
+    Итог отдается полем верхнего уровня total_field рядом с results.
+    """
+
+    total_field = 'total'
+    total_schema = {'type': 'integer'}
+
+    def get_paginated_response(self, data, total=None):
+        response = super().get_paginated_response(data)
+        response.data[self.total_field] = total
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties'][self.total_field] = self.total_schema
+        return response_schema
+
+
+class SubscriptionCursorPagination(KeysetPagination):
+    """Пагинация подписок по дате начала"""
+
+    ordering = ('start_date', 'id')
+
+
+class CashbackCursorPagination(TotalKeysetPagination):
+    """Пагинация кэшбэка по дате начала подписки с общим кэшбэком"""
+
+    ordering = ('start_date', 'id')
+    total_field = 'total_cashback'
+    total_schema = {'type': 'number'}
+
+
+class ExpenseCursorPagination(TotalKeysetPagination):
+    """Пагинация расходов по дате начала подписки с общей суммой"""
+
+    ordering = ('start_date', 'id')
+    total_field = 'total_expenses'
+
+
+class PaidCursorPagination(TotalKeysetPagination):
+    """Пагинация платежей по дате окончания подписки с общей суммой"""
+
+    ordering = ('end_date', 'id')
+    total_field = 'total_paids'
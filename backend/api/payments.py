@@ -0,0 +1,94 @@
+import bisect
+import calendar
+import datetime
+from collections import Counter, defaultdict
+
+from django.utils import timezone
+
+from services.models import Terms
+
+GROUPS = ('day', 'week', 'month')
+MAX_HORIZON_MONTHS = 60
+
+
+def shift_months(value, months):
+    """Та же дата через months месяцев, день ограничен длиной месяца"""
+    month = value.month - 1 + months
+    year, month = value.year + month // 12, month % 12 + 1
+    return value.replace(
+        year=year,
+        month=month,
+        day=min(value.day, calendar.monthrange(year, month)[1]),
+    )
+
+
+def subscription_charges(rows):
+    """Следующие списания подписок.
+
+    rows - тройки (renew_at, duration, price) подписки и ее тарифа.
+    Возвращает тройки (дата следующего списания, период в днях, сумма
+    списания), подписки без продления пропускаются.
+    """
+    for renew_at, duration, price in rows:
+        if renew_at is None:
+            continue
+        yield (
+            timezone.localtime(renew_at).date(),
+            *Terms.period_terms(duration, price),
+        )
+
+
+def project_payments(charges, start, end, group='month'):
+    """Суммы будущих списаний за [start, end) по дням, неделям или месяцам.
+
+    charges - тройки из subscription_charges. Даты списаний одной
+    подписки образуют арифметическую прогрессию с шагом в период тарифа,
+    поэтому первая дата внутри интервала находится делением, а группа
+    каждой даты - целочисленной арифметикой над порядковыми номерами
+    дней, без создания дат для каждого списания. Подписки с одной первой
+    датой и одним периодом попадают в одни и те же группы, поэтому их
+    суммы и количество складываются до обхода дат: число обходов зависит
+    от горизонта и набора периодов, а не от количества подписок.
+    Возвращает непустые группы в порядке дат: начало группы, сумму и
+    количество списаний.
+    """
+    first_day, last_day = start.toordinal(), end.toordinal()
+    if group == 'month':
+        months = (
+            (end.year - start.year) * 12 + end.month - start.month
+            + (end.day > 1)
+        )
+        month_starts = [
+            shift_months(start.replace(day=1), number).toordinal()
+            for number in range(months)
+        ]
+
+    progressions = defaultdict(lambda: [0, 0])
+    for charge_date, period, amount in charges:
+        day = charge_date.toordinal()
+        if day < first_day:
+            day += -(-(first_day - day) // period) * period
+        if day < last_day:
+            progression = progressions[day, period]
+            progression[0] += amount
+            progression[1] += 1
+
+    totals, counts = Counter(), Counter()
+    for (first, period), (amount, number) in progressions.items():
+        for day in range(first, last_day, period):
+            if group == 'day':
+                key = day
+            elif group == 'week':
+                key = day - (day - 1) % 7
+            else:
+                key = month_starts[bisect.bisect_right(month_starts, day) - 1]
+            totals[key] += amount
+            counts[key] += number
+    return [
+        {
+            'date': datetime.date.fromordinal(key),
+            'total': totals[key],
+            'count': counts[key],
+        }
+        for key in sorted(totals)
+    ]
@@ -0,0 +1,38 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSON-рендерер на orjson.
+
+    Компактный ответ без отступов совпадает байт в байт с ответом
+    JSONRenderer: типы, которых нет в orjson (Decimal, даты, ленивые
+    строки), преобразуются тем же энкодером DRF, а символы U+2028 и U+2029
+    экранируются так же. Ответы с отступами, например для Browsable API,
+    строит JSONRenderer.
+    """
+
+    options = (
+        orjson.OPT_NON_STR_KEYS
+        | orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_DATACLASS
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if (
+            data is None
+            or indent is not None
+            or not self.compact
+            or self.ensure_ascii
+        ):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        return orjson.dumps(
+            data, default=self.encoder_class().default, option=self.options
+        ).replace(
+            b'\xe2\x80\xa8', b'\\u2028'
+        ).replace(
+            b'\xe2\x80\xa9', b'\\u2029'
+        )
@@ -0,0 +1,147 @@
+import datetime
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .cache import invalidate_main_page
+from services.models import BankCard, MonthlySpending, Subscription, month_of
+
+NO_CARD_ERROR = 'К подписке не привязана банковская карта.'
+NO_FUNDS_ERROR = 'На банковской карте недостаточно средств для продления.'
+
+
+def retry_delay(attempts):
+    """Пауза перед повторной попыткой, удваивается после каждой неудачи"""
+    return datetime.timedelta(
+        seconds=settings.RENEWAL_RETRY_SECONDS * 2 ** (attempts - 1)
+    )
+
+
+def charge(subscription):
+    """Списание стоимости следующего периода, возвращает текст ошибки.
+
+    Баланс уменьшается условным UPDATE, поэтому карта не уходит в минус
+    даже при параллельном списании по другим подпискам.
+    """
+    if subscription.bank_card_id is None:
+        return NO_CARD_ERROR
+    amount = subscription.terms.period_price
+    debited = BankCard.objects.filter(
+        pk=subscription.bank_card_id, balance__gte=amount
+    ).update(balance=F('balance') - amount)
+    return None if debited else NO_FUNDS_ERROR
+
+
+def renew_batch(cutoff, batch_size, now=None, max_id=None):
+    """Продление одной пачки подписок со сроком продления до cutoff.
+
+    Пачка захватывается SELECT ... FOR UPDATE SKIP LOCKED, поэтому
+    несколько процессов разбирают очередь параллельно и не ждут друг
+    друга. Каждое списание записывается новой подпиской на следующий
+    период, которая и ждет следующего продления, а прошлый период не
+    меняется, поэтому списание попадает в расходы и кэшбэк, а итоги
+    прошлых месяцев остаются прежними. Списания, новые периоды и пересчет
+    помесячной сводки выполняются в одной транзакции с захватом. Карты
+    списываются в порядке их идентификаторов, чтобы параллельные пачки не
+    блокировали друг друга по кругу. После неудачи подписка откладывается
+    на retry_delay, после RENEWAL_MAX_ATTEMPTS неудач продление
+    прекращается. Если следующий период закончился бы уже к now, например
+    после простоя, он начинается с now: списывается один период, а не
+    все пропущенные. max_id ограничивает пачку подписками с меньшим или
+    равным идентификатором.
+
+    Возвращает счетчики claimed, renewed, failed и expired.
+    """
+    now = now or timezone.now()
+    result = Counter()
+    due = Subscription.objects.due_for_renewal(cutoff, now)
+    if max_id is not None:
+        due = due.filter(pk__lte=max_id)
+    with transaction.atomic():
+        subscriptions = list(
+            due.select_for_update(skip_locked=True, of=('self',))
+            .select_related('terms')
+            .order_by('renew_at')[:batch_size]
+        )
+        if not subscriptions:
+            return result
+        result['claimed'] = len(subscriptions)
+        months, periods = set(), []
+        subscriptions.sort(key=lambda item: (item.bank_card_id or 0, item.pk))
+        for subscription in subscriptions:
+            error = charge(subscription)
+            if error is None:
+                duration = datetime.timedelta(
+                    days=subscription.terms.duration_days
+                )
+                start_date = subscription.end_date or subscription.renew_at
+                if start_date + duration <= now:
+                    start_date = now
+                end_date = start_date + duration
+                periods.append(Subscription(
+                    user_id=subscription.user_id,
+                    service_id=subscription.service_id,
+                    terms_id=subscription.terms_id,
+                    bank_card_id=subscription.bank_card_id,
+                    start_date=start_date,
+                    end_date=end_date,
+                    renew_at=end_date,
+                ))
+                months.update((month_of(start_date), month_of(end_date)))
+                subscription.renew_at = None
+                subscription.renewal_attempts = 0
+                subscription.renewal_error = ''
+                result['renewed'] += 1
+                continue
+            subscription.renewal_attempts += 1
+            subscription.renewal_error = error
+            if subscription.renewal_attempts >= settings.RENEWAL_MAX_ATTEMPTS:
+                subscription.renew_at = None
+                result['expired'] += 1
+            else:
+                subscription.renew_at = now + retry_delay(
+                    subscription.renewal_attempts
+                )
+                result['failed'] += 1
+        # Прошлые периоды освобождают уникальное ограничение действующей
+        # подписки до вставки новых.
+        Subscription.objects.bulk_update(
+            subscriptions, ('renew_at', 'renewal_attempts', 'renewal_error')
+        )
+        Subscription.objects.bulk_create(periods)
+        user_ids = {subscription.user_id for subscription in subscriptions}
+        if months:
+            MonthlySpending.objects.rebuild(user_ids=user_ids, months=months)
+        transaction.on_commit(lambda: [
+            invalidate_main_page(user_id) for user_id in user_ids
+        ])
+    return result
+
+
+def renew_due(cutoff, batch_size, max_batches=None, report=None):
+    """Продление всех подписок со сроком до cutoff пачками.
+
+    Продлеваются только подписки, существовавшие на момент запуска:
+    периоды, созданные этим запуском, повторно не продлеваются, даже если
+    их срок тоже наступил до cutoff. report(number, result, seconds)
+    вызывается после каждой пачки. Возвращает суммарные счетчики.
+    """
+    total = Counter()
+    number = 0
+    max_id = Subscription.objects.aggregate(max_id=Max('id'))['max_id']
+    if max_id is None:
+        return total
+    while max_batches is None or number < max_batches:
+        started = time.perf_counter()
+        result = renew_batch(cutoff, batch_size, max_id=max_id)
+        if not result['claimed']:
+            break
+        number += 1
+        total.update(result)
+        if report is not None:
+            report(number, result, time.perf_counter() - started)
+    return total
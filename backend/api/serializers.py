@@ -1,4 +1,8 @@
-from django.db.models import Sum
+from collections import defaultdict
+
+from django.db.models import FileField
+from django.db.models.fields.files import FieldFile
+from django.utils import timezone
 from djoser.serializers import UserSerializer
 from rest_framework import serializers
 
@@ -8,8 +12,19 @@ from services.models import (
     Comparison,
     Service,
     Subscription,
-    Terms
+    Terms,
+    kopecks_to_rubles,
+)
+from .cache import cached_catalog
+from .payments import (
+    GROUPS,
+    MAX_HORIZON_MONTHS,
+    project_payments,
+    shift_months,
+    subscription_charges,
 )
+from .sparse import FIELDS_PARAM, SparseFieldsMixin, check_names
+from .timing import timed
 from PAY2U.settings import SUBSCRIBE_LIMIT
 from users.models import User
 
@@ -38,31 +53,82 @@ class CustomUserCreateSerializer(UserSerializer):
         )
 
 
-class CategorySerializer(serializers.ModelSerializer):
+def attach_catalog_services(categories):
+    """Подгрузка первых SUBSCRIBE_LIMIT сервисов категорий с условиями.
+
+    Сервисы всех категорий выбираются одним оконным запросом, условия
+    подписок - одним дополнительным запросом. Результат сохраняется в
+    атрибут catalog_services каждой категории.
+    """
+    categories = [
+        category for category in categories
+        if not hasattr(category, 'catalog_services')
+    ]
+    if not categories:
+        return
+    services = Service.objects.filter(
+        category__in={category.id for category in categories}
+    ).top_per_category(SUBSCRIBE_LIMIT).prefetch_related(
+        'subscription_terms'
+    )
+    services_by_category = defaultdict(list)
+    for service in services:
+        services_by_category[service.category_id].append(service)
+    for category in categories:
+        category.catalog_services = services_by_category[category.id]
+
+
+class CatalogListSerializer(serializers.ListSerializer):
+    """Список категорий с предзагрузкой сервисов"""
+
+    def to_representation(self, data):
+        if 'services' in self.child.fields:
+            attach_catalog_services(data)
+        return super().to_representation(data)
+
+
+class ServiceListSerializer(serializers.ListSerializer):
+    """Список сервисов с предзагрузкой сервисов их категорий"""
+
+    def to_representation(self, data):
+        category = self.child.fields.get('category')
+        if (
+            isinstance(category, CategorySerializer)
+            and 'services' in category.fields
+        ):
+            attach_catalog_services([service.category for service in data])
+        return super().to_representation(data)
+
+
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор категорий"""
     services = serializers.SerializerMethodField()
 
     class Meta:
         model = Category
         fields = ['id', 'name', 'services']
+        list_serializer_class = CatalogListSerializer
+        expandable_fields = {'services': None}
 
     def get_services(self, obj):
         """Получение списка сервисов категории"""
 
-        categorys_services = obj.services.all()[:SUBSCRIBE_LIMIT]
+        attach_catalog_services([obj])
+        categorys_services = obj.catalog_services
 
         if categorys_services:
             serializer = AdditionalForServiceSerializer(
                 categorys_services,
                 context={'request': self.context['request']},
                 many=True,
+                **self.nested_options('services'),
             )
             return serializer.data
 
         return []
 
 
-class ServiceSerializer(serializers.ModelSerializer):
+class ServiceSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор сервисов"""
     min_price = serializers.SerializerMethodField()
     max_cashback = serializers.SerializerMethodField()
@@ -74,6 +140,10 @@ class ServiceSerializer(serializers.ModelSerializer):
             'name', 'image', 'text', 'category', 'min_price', 'max_cashback',
             'is_featured'
         ]
+        list_serializer_class = ServiceListSerializer
+        expandable_fields = {
+            'category': serializers.PrimaryKeyRelatedField(read_only=True),
+        }
 
     def get_min_price(self, obj):
         min_price = obj.min_price
@@ -84,6 +154,21 @@ class ServiceSerializer(serializers.ModelSerializer):
         return max_cashback if max_cashback is not None else 0
 
 
+def featured_services(request=None):
+    """Лучшие предложения из кэша каталога"""
+    def build():
+        services = Service.objects.filter(
+            is_featured=True
+        ).select_related('category')
+        return ServiceSerializer(
+            services, many=True, context={'request': request}
+        ).data
+
+    return cached_catalog(
+        'featured', build, request.build_absolute_uri('/') if request else ''
+    )
+
+
 class TermsSerializer(serializers.ModelSerializer):
     """Сериализатор условий подписок"""
     class Meta:
@@ -91,13 +176,16 @@ class TermsSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'price', 'duration', 'cashback']
 
 
-class ServiceWithTermsSerializer(serializers.ModelSerializer):
+class ServiceWithTermsSerializer(
+    SparseFieldsMixin, serializers.ModelSerializer
+):
     """Сериализатор сервиса с условиями """
     subscription_terms = TermsSerializer(many=True, read_only=True)
 
     class Meta:
         model = Service
         fields = ['id', 'name', 'image', 'text', 'subscription_terms']
+        expandable_fields = {'subscription_terms': None}
 
 
 class TermDetailSerializer(serializers.ModelSerializer):
@@ -157,7 +245,7 @@ class PaidSerializer(serializers.ModelSerializer):
         fields = ['service_name', 'category_name', 'price', 'end_date']
 
 
-class CashbackSerializer(serializers.ModelSerializer):
+class CashbackSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для отображения кэшбэка пользователя"""
     cashback_amount = serializers.SerializerMethodField()
     service_name = serializers.CharField(source='service.name')
@@ -169,7 +257,9 @@ class CashbackSerializer(serializers.ModelSerializer):
 
     def get_cashback_amount(self, obj):
         """Получений суммы кэшбэка для конретного сервиса"""
-        return obj.terms.price * (obj.terms.cashback / 100)
+        if hasattr(obj, 'cashback_kopecks'):
+            return kopecks_to_rubles(obj.cashback_kopecks)
+        return kopecks_to_rubles(obj.terms.price * obj.terms.cashback)
 
 
 class UserSubscribeSerializer(serializers.ModelSerializer):
@@ -189,6 +279,75 @@ class UserSubscribeSerializer(serializers.ModelSerializer):
         ]
 
 
+class ValuesSerializer:
+    """Быстрая сериализация списков только для чтения.
+
+    Поля берутся из обычного сериализатора: source поля превращается в
+    путь для values(), а значение из строки выборки преобразуется
+    методом to_representation того же поля. Результат совпадает с
+    ответом исходного сериализатора, но без создания объектов моделей и
+    обхода полей DRF для каждой записи. Поля без пути в модели
+    (SerializerMethodField, вложенные сериализаторы) не поддерживаются.
+    fields ограничивает ответ и выборку перечисленными полями.
+    """
+
+    def __init__(self, serializer_class, context=None, fields=None):
+        serializer = serializer_class(context=context)
+        model = serializer.Meta.model
+        readable = {
+            field.field_name: field for field in serializer._readable_fields
+        }
+        check_names(FIELDS_PARAM, fields, readable)
+        self.fields = []
+        for field in readable.values():
+            if fields is not None and field.field_name not in fields:
+                continue
+            if (
+                not field.source_attrs
+                or isinstance(field, serializers.BaseSerializer)
+                or isinstance(field, serializers.RelatedField)
+            ):
+                raise TypeError(
+                    f'Поле {serializer_class.__name__}.{field.field_name} '
+                    f'нельзя получить из values()'
+                )
+            model_field = self.get_model_field(model, field.source_attrs)
+            self.fields.append((
+                field.field_name,
+                '__'.join(field.source_attrs),
+                field,
+                model_field if isinstance(model_field, FileField) else None,
+            ))
+
+    @staticmethod
+    def get_model_field(model, attrs):
+        for attr in attrs[:-1]:
+            model = model._meta.get_field(attr).related_model
+        return model._meta.get_field(attrs[-1])
+
+    def values(self, queryset, *extra):
+        """Выборка полей сериализатора и дополнительных полей, например
+        ключей сортировки пагинации"""
+        paths = [path for _, path, _, _ in self.fields]
+        return queryset.values(*dict.fromkeys([*paths, *extra]))
+
+    @timed
+    def to_representation(self, rows):
+        data = []
+        for row in rows:
+            item = {}
+            for name, path, field, file_field in self.fields:
+                value = row[path]
+                if value is None:
+                    item[name] = None
+                    continue
+                if file_field is not None:
+                    value = FieldFile(None, file_field, value)
+                item[name] = field.to_representation(value)
+            data.append(item)
+        return data
+
+
 class TermsPriceCashbackSerializer(serializers.ModelSerializer):
     """Сериализатор для отображения цены и кэшбэка для сервиса"""
 
@@ -238,11 +397,7 @@ class MainSubscriptionSerializer(serializers.ModelSerializer):
 class MainPageSerializer(serializers.ModelSerializer):
     """Сериализатор главной страницы"""
     best_offer = serializers.SerializerMethodField()
-    subscription = MainSubscriptionSerializer(
-        many=True,
-        source='subscriptions',
-        read_only=True
-    )
+    subscription = serializers.SerializerMethodField()
     total_cashback = serializers.SerializerMethodField()
     total_expenses = serializers.SerializerMethodField()
     total_paids = serializers.SerializerMethodField()
@@ -256,36 +411,62 @@ class MainPageSerializer(serializers.ModelSerializer):
 
     def get_best_offer(self, obj):
         """Лучшее предложение"""
-        featured_services = Service.objects.filter(is_featured=True)
-        serializer = ServiceSerializer(
-            featured_services,
+        return featured_services(self.context.get('request'))
+
+    def subscriptions(self, obj):
+        """Подписки пользователя с сервисами и тарифами"""
+        if not hasattr(self, '_subscriptions'):
+            self._subscriptions = list(
+                obj.subscriptions.select_related('service', 'terms')
+            )
+        return self._subscriptions
+
+    def get_subscription(self, obj):
+        """Подписки пользователя"""
+        serializer = MainSubscriptionSerializer(
+            self.subscriptions(obj),
             many=True,
-            context={'request': self.context.get('request')}
+            context=self.context,
         )
         return serializer.data
 
+    def spending_totals(self, obj):
+        """Итоги пользователя из помесячной сводки"""
+        if not hasattr(self, '_spending'):
+            self._spending = obj.monthly_spending.totals()
+        return self._spending
+
     def get_total_cashback(self, obj):
         """Общий кэшбэк"""
-        queryset = obj.subscriptions.all()
-        return sum(
-            sub.terms.price * (sub.terms.cashback / 100) for sub in queryset
-        )
+        return kopecks_to_rubles(self.spending_totals(obj)['cashback_kopecks'])
 
     def get_total_expenses(self, obj):
         """Общая сумма рассходов"""
-        queryset = obj.subscriptions.all()
-        return (
-            queryset.aggregate(Sum('terms__price'))['terms__price__sum'] or 0
-        )
+        return self.spending_totals(obj)['expenses']
 
     def get_total_paids(self, obj):
-        """Общая сумма к оплате"""
-        queryset = obj.subscriptions.all()
-        return (
-            queryset.aggregate(Sum('terms__price'))['terms__price__sum'] or 0
+        """Сумма списаний по подпискам до конца текущего месяца"""
+        today = timezone.localdate()
+        charges = subscription_charges(
+            (item.renew_at, item.terms.duration, item.terms.price)
+            for item in self.subscriptions(obj)
+        )
+        return sum(
+            period['total'] for period in project_payments(
+                charges, today, shift_months(today.replace(day=1), 1)
+            )
         )
 
 
+class PaymentCalendarQuerySerializer(serializers.Serializer):
+    """Параметры календаря платежей"""
+    start = serializers.DateField(required=False)
+    months = serializers.IntegerField(
+        default=12, min_value=1, max_value=MAX_HORIZON_MONTHS
+    )
+    group = serializers.ChoiceField(choices=GROUPS, default='month')
+
+
 class ServiceTermsForCatalogSerializer(serializers.ModelSerializer):
     """Сериализатор для компактного отображения условий сервиса"""
 
@@ -311,18 +492,18 @@ class ComparisonSerializer(serializers.ModelSerializer):
 
     def get_min_price(self, obj):
         """Минимальная цена подписки"""
-        service = Service.objects.get(id=obj.service.id)
-        min_price = service.min_price
+        min_price = obj.service.min_price
         return min_price if min_price is not None else 0
 
     def get_max_cashback(self, obj):
         """Максимальный кэшбек сервиса"""
-        service = Service.objects.get(id=obj.service.id)
-        max_cashback = service.max_cashback
+        max_cashback = obj.service.max_cashback
         return max_cashback if max_cashback is not None else 0
 
 
-class AdditionalForServiceSerializer(serializers.ModelSerializer):
+class AdditionalForServiceSerializer(
+    SparseFieldsMixin, serializers.ModelSerializer
+):
     """Сериализатор для компактного отображения сервисов"""
     service_terms = serializers.SerializerMethodField()
 
@@ -331,11 +512,12 @@ class AdditionalForServiceSerializer(serializers.ModelSerializer):
 
         model = Service
         fields = ('id', 'name', 'image', 'service_terms')
+        expandable_fields = {'service_terms': None}
 
     def get_service_terms(self, obj):
         """Получение списка условий сервиса"""
 
-        categorys_services = Terms.objects.filter(service=obj.id)
+        categorys_services = obj.subscription_terms.all()
 
         serializer = ServiceTermsForCatalogSerializer(
                 categorys_services,
@@ -356,11 +538,13 @@ class CatalogSerializer(serializers.ModelSerializer):
             'name',
             'services',
         )
+        list_serializer_class = CatalogListSerializer
 
     def get_services(self, obj):
         """Получение списка рецептов автора"""
 
-        categorys_services = obj.services.all()[:SUBSCRIBE_LIMIT]
+        attach_catalog_services([obj])
+        categorys_services = obj.catalog_services
 
         if categorys_services:
             serializer = AdditionalForServiceSerializer(
@@ -0,0 +1,109 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_catalog, invalidate_main_page
+from .tasks import enqueue_spending_rebuild
+from services.models import BankCard, Category, Service, Subscription, Terms
+
+
+@receiver(post_init, sender=BankCard)
+def remember_bank_card_balance(sender, instance, **kwargs):
+    """Запоминает баланс карты при загрузке"""
+    instance._initial_balance = instance.__dict__.get('balance')
+
+
+@receiver(post_init, sender=Service)
+def remember_service_featured(sender, instance, **kwargs):
+    """Запоминает признак лучшего предложения при загрузке"""
+    instance._initial_is_featured = instance.__dict__.get('is_featured')
+
+
+@receiver(post_init, sender=Terms)
+def remember_terms_amounts(sender, instance, **kwargs):
+    """Запоминает цену и кэшбэк тарифа при загрузке"""
+    instance._initial_amounts = (
+        instance.__dict__.get('price'),
+        instance.__dict__.get('cashback'),
+    )
+
+
+@receiver(post_init, sender=Service)
+def remember_service_category(sender, instance, **kwargs):
+    """Запоминает категорию сервиса при загрузке"""
+    instance._initial_category_id = instance.__dict__.get('category_id')
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_saved(sender, instance, created, raw=False, **kwargs):
+    """Новая подписка меняет главную страницу пользователя"""
+    if created and not raw:
+        transaction.on_commit(partial(invalidate_main_page, instance.user_id))
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, **kwargs):
+    """Удаление подписки меняет главную страницу пользователя"""
+    transaction.on_commit(partial(invalidate_main_page, instance.user_id))
+
+
+@receiver(post_save, sender=BankCard)
+def bank_card_saved(sender, instance, created, raw=False, **kwargs):
+    """Изменение баланса карты меняет главную страницу владельца"""
+    if raw:
+        return
+    if created or instance.balance != instance._initial_balance:
+        transaction.on_commit(partial(invalidate_main_page, instance.user_id))
+    instance._initial_balance = instance.balance
+
+
+@receiver(post_delete, sender=BankCard)
+def bank_card_deleted(sender, instance, **kwargs):
+    """Удаление карты меняет главную страницу владельца"""
+    transaction.on_commit(partial(invalidate_main_page, instance.user_id))
+
+
+@receiver(post_save, sender=Service)
+def service_saved(sender, instance, raw=False, **kwargs):
+    """Изменение сервиса меняет каталог, а изменение лучших предложений -
+    и главную страницу всех пользователей"""
+    if raw:
+        return
+    transaction.on_commit(invalidate_catalog)
+    if instance.is_featured or instance._initial_is_featured:
+        transaction.on_commit(invalidate_main_page)
+    instance._initial_is_featured = instance.is_featured
+
+
+@receiver(post_save, sender=Terms)
+def terms_amounts_saved(sender, instance, created, raw=False, **kwargs):
+    """Ставит в очередь пересчет сводки подписчиков при изменении цены
+    тарифа"""
+    amounts = (instance.price, instance.cashback)
+    if not (raw or created) and amounts != instance._initial_amounts:
+        enqueue_spending_rebuild(terms_id=instance.pk)
+    instance._initial_amounts = amounts
+
+
+@receiver(post_save, sender=Service)
+def service_category_saved(sender, instance, created, raw=False, **kwargs):
+    """Ставит в очередь пересчет сводки подписчиков при смене категории
+    сервиса"""
+    category_id = instance.category_id
+    if not (raw or created) and category_id != instance._initial_category_id:
+        enqueue_spending_rebuild(service_id=instance.pk)
+    instance._initial_category_id = category_id
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=Terms)
+@receiver(post_delete, sender=Terms)
+def catalog_changed(sender, instance, raw=False, **kwargs):
+    """Изменение каталога меняет главную страницу всех пользователей"""
+    if not raw:
+        transaction.on_commit(invalidate_catalog)
+        transaction.on_commit(invalidate_main_page)
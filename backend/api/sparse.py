@@ -0,0 +1,167 @@
+import copy
+
+from rest_framework import serializers
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def parse_paths(value):
+    """Множество путей из параметра запроса, None если параметра нет"""
+    if value is None:
+        return None
+    return {path.strip() for path in value.split(',') if path.strip()}
+
+
+def sparse_params(request):
+    """Параметры fields и expand запроса в виде аргументов сериализатора"""
+    return {
+        'fields': parse_paths(request.query_params.get(FIELDS_PARAM)),
+        'expand': parse_paths(request.query_params.get(EXPAND_PARAM)),
+    }
+
+
+def split_paths(paths):
+    """Поля верхнего уровня и пути для вложенных сериализаторов"""
+    if paths is None:
+        return None, {}
+    names, nested = set(), {}
+    for path in paths:
+        name, _, rest = path.partition('.')
+        names.add(name)
+        if rest:
+            nested.setdefault(name, set()).add(rest)
+    return names, nested
+
+
+def check_names(param, names, allowed):
+    if names is None:
+        return
+    unknown = names - set(allowed)
+    if unknown:
+        raise serializers.ValidationError(
+            {param: 'Неизвестные поля: ' + ', '.join(sorted(unknown))}
+        )
+
+
+class SparseFieldsMixin:
+    """Выбор полей (fields) и раскрытие связей (expand) сериализатора.
+
+    Связи, которые можно не раскрывать, перечислены в
+    Meta.expandable_fields вместе с полем для свернутого вида (None - поле
+    не выводится). Пока expand не передан, ответ не отличается от
+    обычного и все связи раскрыты, с expand раскрываются только
+    перечисленные. Пути вложенных сериализаторов записываются через
+    точку: fields=name,category.name и expand=category.services.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.only_fields = fields
+        self.expand_fields = expand
+
+    def nested_options(self, name):
+        """Аргументы fields и expand для сериализатора связи name"""
+        _, nested_fields = split_paths(self.only_fields)
+        expand, nested_expand = split_paths(self.expand_fields)
+        return {
+            'fields': nested_fields.get(name),
+            'expand': None if expand is None else nested_expand.get(
+                name, set()
+            ),
+        }
+
+    def get_fields(self):
+        fields = super().get_fields()
+        names, _ = split_paths(self.only_fields)
+        expand, _ = split_paths(self.expand_fields)
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        check_names(FIELDS_PARAM, names, fields)
+        check_names(EXPAND_PARAM, expand, expandable)
+        if names is not None:
+            fields = {
+                name: field for name, field in fields.items()
+                if name in names
+            }
+        for name, collapsed in expandable.items():
+            if name not in fields:
+                continue
+            if expand is not None and name not in expand:
+                if collapsed is None:
+                    del fields[name]
+                else:
+                    fields[name] = copy.deepcopy(collapsed)
+                continue
+            child = getattr(fields[name], 'child', fields[name])
+            if isinstance(child, SparseFieldsMixin):
+                options = self.nested_options(name)
+                child.only_fields = options['fields']
+                child.expand_fields = options['expand']
+        return fields
+
+    def model_paths(self, prefix=''):
+        """Поля модели для only() и связи для select_related()"""
+        concrete = {
+            field.name for field in self.Meta.model._meta.concrete_fields
+        }
+        only, related = [], []
+        for name, field in self.fields.items():
+            attr = name if field.source == '*' else field.source_attrs[0]
+            if attr not in concrete:
+                continue
+            only.append(prefix + attr)
+            if (
+                isinstance(field, SparseFieldsMixin)
+                and len(field.source_attrs) == 1
+            ):
+                related.append(prefix + attr)
+                nested_only, nested_related = field.model_paths(
+                    f'{prefix}{attr}__'
+                )
+                only += nested_only
+                related += nested_related
+        return only, related
+
+    def restrict_queryset(self, queryset, *extra):
+        """Выборка только нужных выбранным полям колонок.
+
+        Связи к одному объекту присоединяются, только если они раскрыты.
+        extra - дополнительные поля модели, например ключи сортировки
+        пагинации.
+        """
+        only, related = self.model_paths()
+        concrete = {
+            field.name for field in self.Meta.model._meta.concrete_fields
+        }
+        only += [name for name in extra if name in concrete]
+        queryset = queryset.select_related(None)
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset.only(*dict.fromkeys(only))
+
+
+class SparseFieldsViewMixin:
+    """Параметры fields и expand для действий list и retrieve вьюсета"""
+
+    sparse_actions = ('list', 'retrieve')
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in self.sparse_actions:
+            kwargs.update(sparse_params(self.request))
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in self.sparse_actions:
+            return queryset
+        params = sparse_params(self.request)
+        if params['fields'] is None and params['expand'] is None:
+            return queryset
+        ordering = ()
+        get_ordering = getattr(self.paginator, 'get_ordering', None)
+        if self.action == 'list' and get_ordering is not None:
+            ordering = [
+                field.lstrip('-')
+                for field in get_ordering(self.request, queryset, self)
+            ]
+        return self.get_serializer().restrict_queryset(queryset, *ordering)
@@ -0,0 +1,232 @@
+import datetime
+import logging
+import os
+import socket
+import threading
+import traceback
+from collections import Counter
+from itertools import islice
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .cache import main_page_rebuild_finished, main_page_rebuild_started
+from .idempotency import prune_expired
+from .models import Task
+from .renewals import renew_due
+from services.models import MonthlySpending, Subscription
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(name=None, priority=0, max_attempts=None):
+    """Регистрация функции как фоновой задачи.
+
+    У функции появляется метод enqueue(run_at=None, **kwargs) для
+    постановки в очередь с приоритетом и числом попыток из декоратора.
+    Аргументы задачи хранятся в JSON, поэтому передаются простыми типами.
+    """
+    def decorator(function):
+        task_name = name or f'{function.__module__}.{function.__name__}'
+        TASKS[task_name] = function
+
+        def enqueue_task(run_at=None, **kwargs):
+            return enqueue(task_name, kwargs, priority, run_at, max_attempts)
+
+        function.task_name = task_name
+        function.enqueue = enqueue_task
+        return function
+    return decorator
+
+
+def enqueue(name, kwargs=None, priority=0, run_at=None, max_attempts=None):
+    """Постановка задачи в очередь одним INSERT.
+
+    Внутри транзакции задача попадает в очередь вместе с остальными
+    изменениями и пропадает при откате. Задачи с большим priority
+    выполняются раньше, run_at откладывает выполнение.
+    """
+    return Task.objects.create(
+        name=name,
+        kwargs=kwargs or {},
+        priority=priority,
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or settings.TASK_MAX_ATTEMPTS,
+    )
+
+
+def enqueue_once(function, run_at=None, **kwargs):
+    """Постановка задачи в очередь, если она еще не ждет выполнения.
+
+    Для периодических задач: задача ставит себя заново после выполнения,
+    а лишние цепочки, например от одновременного запуска обработчиков,
+    сходятся в одну.
+    """
+    if Task.objects.filter(
+        name=function.task_name, status=Task.QUEUED
+    ).exists():
+        return None
+    return function.enqueue(run_at=run_at, **kwargs)
+
+
+def retry_delay(attempts):
+    """Пауза перед повторной попыткой, удваивается после каждой неудачи"""
+    return datetime.timedelta(
+        seconds=settings.TASK_RETRY_SECONDS * 2 ** (attempts - 1)
+    )
+
+
+def claim(worker, now=None):
+    """Захват готовой задачи с наибольшим приоритетом, None если их нет.
+
+    Строка выбирается SELECT ... FOR UPDATE SKIP LOCKED, поэтому
+    обработчики не ждут друг друга. Захваченная задача получает аренду на
+    TASK_LEASE_SECONDS: если обработчик завершится, не успев сообщить
+    итог, после окончания аренды задачу захватит другой.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        claimed = Task.objects.ready(now).select_for_update(
+            skip_locked=True
+        ).order_by('-priority', 'run_at').first()
+        if claimed is None:
+            return None
+        claimed.status = Task.RUNNING
+        claimed.run_at = now + datetime.timedelta(
+            seconds=settings.TASK_LEASE_SECONDS
+        )
+        claimed.attempts += 1
+        claimed.locked_by = worker
+        claimed.save(
+            update_fields=('status', 'run_at', 'attempts', 'locked_by')
+        )
+    return claimed
+
+
+def execute(claimed):
+    """Выполнение захваченной задачи, возвращает done, retried или failed.
+
+    Выполненная задача удаляется. После ошибки задача возвращается в
+    очередь через retry_delay, после max_attempts попыток остается в
+    таблице со статусом failed и текстом ошибки. Итог записывается, только
+    если задачу не перехватил другой обработчик после окончания аренды.
+    """
+    function = TASKS.get(claimed.name)
+    if claimed.attempts > claimed.max_attempts:
+        error = 'Аренда задачи истекла после последней попытки.'
+    elif function is None:
+        error = f'Задача {claimed.name} не зарегистрирована.'
+    else:
+        try:
+            function(**claimed.kwargs)
+        except Exception:
+            logger.exception('Ошибка фоновой задачи %s', claimed)
+            error = traceback.format_exc()
+        else:
+            Task.objects.filter(
+                pk=claimed.pk, attempts=claimed.attempts
+            ).delete()
+            return 'done'
+    if claimed.attempts >= claimed.max_attempts:
+        outcome, status, run_at = 'failed', Task.FAILED, claimed.run_at
+    else:
+        outcome, status = 'retried', Task.QUEUED
+        run_at = timezone.now() + retry_delay(claimed.attempts)
+    Task.objects.filter(pk=claimed.pk, attempts=claimed.attempts).update(
+        status=status, run_at=run_at, last_error=error, locked_by=''
+    )
+    return outcome
+
+
+def work(stop, sleep, once=False):
+    """Цикл обработчика в отдельном потоке.
+
+    Задачи захватываются и выполняются по одной, пока не установлен stop.
+    Пустая очередь проверяется каждые sleep секунд, с once цикл
+    завершается, как только очередь опустела. Соединение с базой
+    закрывается при выходе из потока. Возвращает счетчики итогов.
+    """
+    worker = (
+        f'{socket.gethostname()}:{os.getpid()}:'
+        f'{threading.current_thread().name}'
+    )
+    result = Counter()
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            try:
+                claimed = claim(worker)
+                if claimed is not None:
+                    result[execute(claimed)] += 1
+            except Exception:
+                logger.exception('Ошибка обработчика очереди %s', worker)
+                connection.close()
+                claimed = None
+            if claimed is None:
+                if once:
+                    break
+                stop.wait(sleep)
+    finally:
+        connection.close()
+    return result
+
+
+@task()
+def rebuild_subscribers_spending(terms_id=None, service_id=None,
+                                 batch_size=1000):
+    """Пересчет помесячной сводки подписчиков тарифа или сервиса.
+
+    Пользователи пересчитываются пачками по batch_size, чтобы не держать
+    блокировки всех подписчиков в одной транзакции. Ставится в очередь
+    через enqueue_spending_rebuild, после пересчета снимает его отметку
+    и сбрасывает кэш главной страницы.
+    """
+    subscriptions = Subscription.objects.order_by()
+    if terms_id is not None:
+        subscriptions = subscriptions.filter(terms_id=terms_id)
+    if service_id is not None:
+        subscriptions = subscriptions.filter(service_id=service_id)
+    user_ids = iter(sorted(set(
+        subscriptions.values_list('user_id', flat=True)
+    )))
+    while batch := list(islice(user_ids, batch_size)):
+        MonthlySpending.objects.rebuild(user_ids=batch)
+    main_page_rebuild_finished()
+
+
+def enqueue_spending_rebuild(terms_id=None, service_id=None):
+    """Постановка пересчета сводки в очередь.
+
+    После фиксации транзакции отмечает пересчет, чтобы главная страница
+    не кэшировалась со старыми итогами до его завершения.
+    """
+    rebuild_subscribers_spending.enqueue(
+        terms_id=terms_id, service_id=service_id
+    )
+    transaction.on_commit(main_page_rebuild_started)
+
+
+@task()
+def renew_subscriptions(batch_size=500, max_batches=None):
+    """Продление подписок, срок которых подошел"""
+    renew_due(timezone.now(), batch_size, max_batches)
+
+
+@task()
+def prune_idempotency_keys(batch_size=5000):
+    """Удаление просроченных ключей идемпотентности.
+
+    Задача ставится при запуске run_worker и после выполнения ставит
+    себя снова через IDEMPOTENCY_PRUNE_SECONDS секунд.
+    """
+    prune_expired(batch_size)
+    enqueue_once(
+        prune_idempotency_keys,
+        run_at=timezone.now() + datetime.timedelta(
+            seconds=settings.IDEMPOTENCY_PRUNE_SECONDS
+        ),
+        batch_size=batch_size,
+    )
@@ -0,0 +1,146 @@
+import datetime
+
+from django.utils import timezone
+
+from services.models import (
+    BankCard,
+    Category,
+    Comparison,
+    MonthlySpending,
+    Service,
+    Subscription,
+    Terms,
+)
+from users.models import User
+
+
+def create_catalog(terms_count, price):
+    """Сервис с terms_count месячными тарифами по цене price"""
+    service = Service.objects.create(
+        name='Сервис',
+        category=Category.objects.create(name='Категория'),
+        image='services/images/test.png',
+        text='Сервис для тестов',
+    )
+    terms = Terms.objects.bulk_create(
+        Terms(
+            name=f'Тариф {number}',
+            duration='one_month',
+            price=price,
+            cashback=0,
+            service=service,
+        )
+        for number in range(terms_count)
+    )
+    return service, terms
+
+
+def create_card(balance):
+    """Пользователь с активной картой и балансом balance"""
+    user = User.objects.create(
+        email='subscriber@example.com', username='subscriber'
+    )
+    return user, BankCard.objects.create(
+        user=user,
+        card_number='0000000000000000',
+        balance=balance,
+        is_active=True,
+    )
+
+
+def create_api_data(size):
+    """Набор данных для проверки запросов, все связанные записи растут с size.
+
+    Возвращает пользователя и идентификаторы для подстановки в маршруты
+    check_query_counts.ROUTES.
+    """
+    prefix = f'qc{size}'
+    now = timezone.now()
+    categories = Category.objects.bulk_create(
+        Category(name=f'{prefix}_category_{index}')
+        for index in range(max(size // 10, 2))
+    )
+    Service.objects.bulk_create(
+        Service(
+            name=f'{prefix}_service_{index}',
+            category=categories[index % len(categories)],
+            text=f'Сервис {index}',
+            is_featured=index % 10 == 0,
+        )
+        for index in range(size + 1)
+    )
+    services = list(
+        Service.objects.filter(name__startswith=f'{prefix}_service_')
+        .order_by('id')
+    )
+    Terms.objects.bulk_create(
+        Terms(
+            service=service,
+            name=name,
+            subscription_type='paid',
+            duration=duration,
+            price=100 + index,
+            cashback=5,
+        )
+        for index, service in enumerate(services)
+        for name, duration in (
+            ('Месяц', 'one_month'), ('Год', 'one_year')
+        )
+    )
+    Service.objects.filter(
+        pk__in=[service.pk for service in services]
+    ).refresh_terms_summary()
+    terms = {}
+    for term in Terms.objects.filter(service__in=services):
+        terms.setdefault(term.service_id, term)
+
+    user = User.objects.create_user(
+        username=prefix,
+        email=f'{prefix}@example.com',
+        password=None,
+        phone_number='+79990000000',
+        first_name='Иван',
+        last_name='Петров',
+    )
+    BankCard.objects.bulk_create(
+        BankCard(
+            user=user,
+            card_number=f'{index:016d}',
+            balance=10 ** 7,
+            is_active=index == 0,
+        )
+        for index in range(max(size // 10, 2))
+    )
+    cards = list(BankCard.objects.filter(user=user).order_by('id'))
+    Subscription.objects.bulk_create(
+        Subscription(
+            user=user,
+            service=service,
+            terms=terms[service.pk],
+            start_date=now - datetime.timedelta(days=index),
+            end_date=(
+                now - datetime.timedelta(days=index - 30)
+                if index % 2 else None
+            ),
+            renew_at=(
+                now - datetime.timedelta(days=index - 30)
+                if index % 2 else None
+            ),
+            bank_card=cards[0],
+        )
+        for index, service in enumerate(services[:-1])
+    )
+    MonthlySpending.objects.rebuild(user_ids=[user.pk])
+    Comparison.objects.bulk_create(
+        Comparison(user=user, service=service)
+        for service in services[:-1]
+    )
+    return {
+        'user': user,
+        'prefix': prefix,
+        'card_id': cards[1].pk,
+        'service_id': services[0].pk,
+        'terms_id': terms[services[0].pk].pk,
+        'new_service_id': services[-1].pk,
+        'new_terms_id': terms[services[-1].pk].pk,
+    }
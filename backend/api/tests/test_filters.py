@@ -0,0 +1,144 @@
+import datetime
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.filters import PaidFilter, SubscriptionFilter
+from api.management.commands.explain_queries import (
+    Command as ExplainCommand,
+    DATE_RANGE_INDEXES,
+)
+from services.models import Subscription
+
+from .fixtures import create_api_data
+
+
+def moment(day, hour=0, minute=0, second=0):
+    """Время в текущем часовом поясе"""
+    return timezone.make_aware(
+        datetime.datetime.combine(day, datetime.time(hour, minute, second))
+    )
+
+
+@override_settings(TIME_ZONE='Europe/Moscow')
+class DayFilterTests(TestCase):
+    """Фильтр периода подписок по календарным дням"""
+
+    DAY = datetime.date(2024, 3, 15)
+
+    @classmethod
+    def setUpTestData(cls):
+        context = create_api_data(4)
+        cls.user = context['user']
+        cls.subscriptions = list(
+            Subscription.objects.filter(user=cls.user).order_by('id')
+        )
+
+    def set_dates(self, *dates):
+        """Даты начала и окончания подписок пользователя по порядку"""
+        for subscription, date in zip(self.subscriptions, dates):
+            subscription.start_date = subscription.end_date = date
+        Subscription.objects.bulk_update(
+            self.subscriptions, ('start_date', 'end_date')
+        )
+
+    def filtered(self, filterset_class, start_date, end_date):
+        return list(filterset_class(
+            {'start_date': start_date, 'end_date': end_date},
+            queryset=Subscription.objects.filter(user=self.user),
+        ).qs.order_by('id'))
+
+    def test_period_includes_whole_days(self):
+        self.set_dates(
+            moment(self.DAY - datetime.timedelta(days=1), 23, 59, 59),
+            moment(self.DAY),
+            moment(self.DAY, 23, 59, 59),
+            moment(self.DAY + datetime.timedelta(days=1)),
+        )
+        expected = self.subscriptions[1:3]
+        for filterset_class in (SubscriptionFilter, PaidFilter):
+            with self.subTest(filterset=filterset_class.__name__):
+                self.assertEqual(
+                    self.filtered(filterset_class, self.DAY, self.DAY),
+                    expected,
+                )
+
+    def test_conditions_compare_the_column(self):
+        queryset = SubscriptionFilter(
+            {'start_date': self.DAY, 'end_date': self.DAY},
+            queryset=Subscription.objects.filter(user=self.user),
+        ).qs
+        sql = str(queryset.query)
+        self.assertNotIn('django_datetime_cast_date', sql)
+        self.assertIn('"start_date" >=', sql)
+        self.assertIn('"start_date" <', sql)
+
+    def test_expenses_endpoint_uses_the_filter(self):
+        self.set_dates(
+            moment(self.DAY - datetime.timedelta(days=1), 23, 59, 59),
+            moment(self.DAY),
+            moment(self.DAY, 23, 59, 59),
+            moment(self.DAY + datetime.timedelta(days=1)),
+        )
+        token = AccessToken.for_user(self.user)
+        response = self.client.get(
+            '/api/user/expenses/',
+            {'start_date': self.DAY, 'end_date': self.DAY},
+            HTTP_AUTHORIZATION=f'Bearer {token}',
+        )
+        self.assertEqual(response.status_code, 200)
+        expected = self.subscriptions[1:3]
+        self.assertEqual(
+            [item['service_name'] for item in response.json()['results']],
+            [item.service.name for item in expected],
+        )
+        self.assertEqual(
+            response.json()['total_expenses'],
+            sum(item.terms.price for item in expected),
+        )
+
+    def test_invalid_date_is_rejected(self):
+        token = AccessToken.for_user(self.user)
+        response = self.client.get(
+            '/api/user/expenses/',
+            {'start_date': '15.03.2024'},
+            HTTP_AUTHORIZATION=f'Bearer {token}',
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class DateRangeIndexTests(TestCase):
+    """Условия на период выполняются поиском по индексу"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_api_data(500)['user']
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_period_filters_use_range_index(self):
+        today = timezone.localdate()
+        queries = {
+            'expenses': SubscriptionFilter(
+                {
+                    'start_date': today - datetime.timedelta(days=30),
+                    'end_date': today,
+                },
+                queryset=Subscription.objects.filter(user=self.user),
+            ).qs,
+            'paids': PaidFilter(
+                {'start_date': today, 'end_date': today},
+                queryset=Subscription.objects.filter(
+                    user=self.user, end_date__isnull=False
+                ),
+            ).qs,
+        }
+        explain = ExplainCommand()
+        for name, queryset in queries.items():
+            plan = queryset.explain()
+            with self.subTest(query=name, plan=plan):
+                self.assertTrue(
+                    explain.uses_range_index(plan, *DATE_RANGE_INDEXES[name])
+                )
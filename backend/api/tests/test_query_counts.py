@@ -0,0 +1,66 @@
+import json
+
+from django.test import TestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.cache import invalidate_catalog, invalidate_main_page
+from api.management.commands.check_query_counts import ROUTES
+
+from .fixtures import create_api_data
+
+QUERY_COUNTS = {
+    'main': 6,
+    'comparison': 2,
+    'cards': 2,
+    'cards-activate': 4,
+    'categories-catalog': 7,
+    'services-list': 4,
+    'services-search': 4,
+    'services-detail': 4,
+    'services-best-offer': 4,
+    'services-term-detail': 6,
+    'services-subscribe': 17,
+    'services-add-comparison': 4,
+    'users-subscriptions': 2,
+    'users-cashback': 2,
+    'users-expenses': 2,
+    'users-paids': 2,
+    'users-calendar': 2,
+    'users-me': 1,
+}
+
+
+class QueryCountTests(TestCase):
+    """Количество запросов к базе на маршрутах API не растет с объемом"""
+
+    SIZES = (10, 200)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.contexts = {size: create_api_data(size) for size in cls.SIZES}
+
+    def test_routes_are_listed(self):
+        self.assertEqual(
+            [name for name, *_ in ROUTES], list(QUERY_COUNTS)
+        )
+
+    def test_query_counts(self):
+        for size, context in self.contexts.items():
+            token = AccessToken.for_user(context['user'])
+            for name, method, path, data in ROUTES:
+                invalidate_catalog()
+                invalidate_main_page(context['user'].pk)
+                request = {
+                    'path': path.format(**context),
+                    'HTTP_AUTHORIZATION': f'Bearer {token}',
+                }
+                if data is not None:
+                    request['data'] = json.dumps({
+                        key: value.format(**context)
+                        for key, value in data.items()
+                    })
+                    request['content_type'] = 'application/json'
+                with self.subTest(route=name, size=size):
+                    with self.assertNumQueries(QUERY_COUNTS[name]):
+                        response = getattr(self.client, method)(**request)
+                    self.assertLess(response.status_code, 400)
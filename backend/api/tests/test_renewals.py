@@ -0,0 +1,57 @@
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from api.renewals import renew_due
+from services.models import Subscription
+
+from .fixtures import create_card, create_catalog
+
+
+class RenewDueTests(TestCase):
+    """Продление подписок, срок которых подошел"""
+
+    def setUp(self):
+        self.service, (self.terms,) = create_catalog(1, 100)
+        self.user, self.card = create_card(1000)
+        self.now = timezone.now()
+        self.period = datetime.timedelta(days=self.terms.duration_days)
+
+    def subscribe(self, end_date):
+        return Subscription.objects.create(
+            user=self.user,
+            service=self.service,
+            terms=self.terms,
+            bank_card=self.card,
+            start_date=end_date - self.period,
+            end_date=end_date,
+            renew_at=end_date,
+        )
+
+    def test_overdue_subscription_is_charged_once(self):
+        self.subscribe(self.now - 5 * self.period)
+        result = renew_due(self.now, batch_size=1)
+        self.assertEqual(result['claimed'], 1)
+        self.assertEqual(result['renewed'], 1)
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.balance, 1000 - self.terms.period_price)
+        current = self.user.subscriptions.get(renew_at__isnull=False)
+        self.assertGreaterEqual(current.start_date, self.now)
+        self.assertGreater(current.renew_at, self.now)
+        self.assertEqual(renew_due(self.now, batch_size=1)['claimed'], 0)
+
+    def test_periods_created_in_a_run_are_not_renewed(self):
+        self.subscribe(self.now - self.period / 2)
+        cutoff = self.now + 2 * self.period
+        result = renew_due(cutoff, batch_size=1)
+        self.assertEqual(result['renewed'], 1)
+        self.assertEqual(self.user.subscriptions.count(), 2)
+        self.assertEqual(renew_due(cutoff, batch_size=1)['renewed'], 1)
+
+    def test_next_period_continues_the_previous_one(self):
+        previous = self.subscribe(self.now - datetime.timedelta(days=1))
+        renew_due(self.now, batch_size=10)
+        current = self.user.subscriptions.get(renew_at__isnull=False)
+        self.assertEqual(current.start_date, previous.end_date)
+        self.assertEqual(current.end_date, previous.end_date + self.period)
@@ -0,0 +1,96 @@
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import connections
+from django.test import (
+    RequestFactory,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+
+from PAY2U.routers import ReplicaRouter, primary, request_routing
+from users.models import User
+
+from .fixtures import create_card, create_catalog
+
+
+@override_settings(
+    DATABASE_REPLICAS={'replica': 1},
+    DATABASE_ROUTERS=['PAY2U.routers.ReplicaRouter'],
+)
+class ReplicaRouterTests(TransactionTestCase):
+    """Чтение с реплики и запись на основную базу в HTTP-запросах"""
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.service, _ = create_catalog(1, 100)
+        self.user, _ = create_card(1000)
+        self.other = User.objects.create(
+            email='other@example.com', username='other'
+        )
+
+    def request(self, method, path, user):
+        """Ответ и запросы к основной базе и к реплике"""
+        token = AccessToken.for_user(user)
+        with CaptureQueriesContext(connections['default']) as default:
+            with CaptureQueriesContext(connections['replica']) as replica:
+                response = getattr(self.client, method)(
+                    path, HTTP_AUTHORIZATION=f'Bearer {token}'
+                )
+        self.assertLess(response.status_code, 400)
+        return response, default.captured_queries, replica.captured_queries
+
+    def add_comparison(self, user):
+        return self.request(
+            'post', f'/api/services/{self.service.pk}/add_comparison/', user
+        )
+
+    def test_safe_requests_read_from_replica(self):
+        _, default, replica = self.request(
+            'get', '/api/comparison/', self.user
+        )
+        self.assertEqual(default, [])
+        self.assertNotEqual(replica, [])
+
+    def test_writes_go_to_primary(self):
+        _, default, replica = self.add_comparison(self.user)
+        self.assertNotEqual(default, [])
+        self.assertEqual(replica, [])
+        self.assertTrue(self.user.user_comparison.exists())
+
+    def test_user_reads_primary_after_write(self):
+        self.add_comparison(self.user)
+        response, default, replica = self.request(
+            'get', '/api/comparison/', self.user
+        )
+        # Пользователь JWT неизвестен до аутентификации, поэтому на реплику
+        # уходит только его загрузка.
+        self.assertEqual(len(replica), 1)
+        self.assertIn('users_user', replica[0]['sql'])
+        self.assertNotEqual(default, [])
+        self.assertEqual(len(response.json()), 1)
+        _, default, replica = self.request(
+            'get', '/api/comparison/', self.other
+        )
+        self.assertEqual(default, [])
+        self.assertNotEqual(replica, [])
+
+    def test_reads_outside_requests_use_primary(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(User), 'default')
+        with request_routing(RequestFactory().get('/')):
+            self.assertEqual(router.db_for_read(User), 'replica')
+            with primary():
+                self.assertEqual(router.db_for_read(User), 'default')
+            self.assertEqual(router.db_for_write(User), 'default')
+
+    @override_settings(DATABASE_REPLICAS={'replica': 3, 'replica_2': 1})
+    def test_reads_follow_replica_weights(self):
+        router = ReplicaRouter()
+        with request_routing(RequestFactory().get('/')):
+            aliases = Counter(router.db_for_read(User) for _ in range(8))
+        self.assertEqual(aliases, {'replica': 6, 'replica_2': 2})
@@ -0,0 +1,80 @@
+import datetime
+from decimal import Decimal
+
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api.management.commands.benchmark_serialization import SERIALIZERS
+from api.renderers import ORJSONRenderer
+from api.serializers import ValuesSerializer
+from services.models import Subscription
+
+from .fixtures import create_api_data
+
+
+class ORJSONRendererTests(TestCase):
+    """ORJSONRenderer совпадает с JSONRenderer байт в байт"""
+
+    def test_same_bytes_as_json_renderer(self):
+        data = {
+            'text': 'Подписка на сервис "кино"\u2028\u2029',
+            'price': Decimal('199.90'),
+            'date': datetime.date(2024, 2, 29),
+            'moment': timezone.now(),
+            'naive': datetime.datetime(2024, 1, 1, 12, 30, 15, 123456),
+            'time': datetime.time(8, 15),
+            'duration': datetime.timedelta(days=30),
+            1: [None, True, 1.5, -2],
+        }
+        self.assertEqual(
+            ORJSONRenderer().render(data), JSONRenderer().render(data)
+        )
+
+    def test_empty_response(self):
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+
+class ValuesSerializerTests(TestCase):
+    """Быстрая сериализация списков совпадает с сериализаторами DRF"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_api_data(20)['user']
+
+    def setUp(self):
+        self.context = {'request': RequestFactory().get('/')}
+
+    def test_same_bytes_as_serializers(self):
+        for name, (serializer_class, filters) in SERIALIZERS.items():
+            queryset = Subscription.objects.filter(
+                user=self.user, **filters
+            ).order_by('id')
+            fast = ValuesSerializer(serializer_class, context=self.context)
+            with self.subTest(serializer=name):
+                self.assertTrue(queryset.exists())
+                self.assertEqual(
+                    ORJSONRenderer().render(
+                        fast.to_representation(fast.values(queryset))
+                    ),
+                    JSONRenderer().render(serializer_class(
+                        queryset, many=True, context=self.context
+                    ).data),
+                )
+
+    def test_selected_fields(self):
+        serializer_class, _ = SERIALIZERS['subscriptions']
+        fast = ValuesSerializer(
+            serializer_class, context=self.context, fields={'id'}
+        )
+        rows = fast.to_representation(fast.values(
+            Subscription.objects.filter(user=self.user).order_by('id')
+        ))
+        self.assertEqual(
+            rows,
+            [
+                {'id': pk} for pk in Subscription.objects.filter(
+                    user=self.user
+                ).order_by('id').values_list('id', flat=True)
+            ],
+        )
@@ -0,0 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from api.utils import SubscribeError, create_subscription
+from services.models import Subscription
+
+from .fixtures import create_card, create_catalog
+
+
+class CreateSubscriptionTests(TestCase):
+    """Оформление подписки со списанием с карты"""
+
+    def setUp(self):
+        self.service, (self.terms, self.other_terms) = create_catalog(2, 100)
+        self.user, self.card = create_card(150)
+
+    def subscribe(self, terms):
+        return create_subscription(
+            self.user, self.service, terms, self.card, timezone.now()
+        )
+
+    def test_debits_period_price(self):
+        subscription = self.subscribe(self.terms)
+        balance = 150 - self.terms.period_price
+        self.assertEqual(self.card.balance, balance)
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.balance, balance)
+        self.assertEqual(subscription.renew_at, subscription.end_date)
+
+    def test_insufficient_funds_keeps_balance(self):
+        self.subscribe(self.terms)
+        with self.assertRaisesMessage(SubscribeError, 'недостаточно средств'):
+            self.subscribe(self.other_terms)
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.balance, 50)
+        self.assertEqual(self.user.subscriptions.count(), 1)
+
+    def test_repeat_subscription_is_rolled_back(self):
+        self.card.balance = 1000
+        self.card.save()
+        self.subscribe(self.terms)
+        with self.assertRaisesMessage(SubscribeError, 'уже подписаны'):
+            self.subscribe(self.terms)
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.balance, 900)
+
+    def test_ended_subscription_does_not_block_new_one(self):
+        self.card.balance = 1000
+        self.card.save()
+        ended = self.subscribe(self.terms)
+        Subscription.objects.filter(pk=ended.pk).update(renew_at=None)
+        self.subscribe(self.terms)
+        self.assertEqual(self.user.subscriptions.count(), 2)
+
+
+class ConcurrentSubscribeTests(TransactionTestCase):
+    """Параллельные подписки с одной карты не уводят баланс в минус"""
+
+    THREADS = 8
+    ATTEMPTS = 40
+    AFFORDABLE = 10
+    PRICE = 100
+
+    def subscribe(self, user, service, terms, card):
+        try:
+            create_subscription(user, service, terms, card, timezone.now())
+            return 'created'
+        except SubscribeError:
+            return 'rejected'
+        finally:
+            connection.close()
+
+    def test_parallel_subscribes_never_overdraw(self):
+        service, terms_list = create_catalog(self.ATTEMPTS, self.PRICE)
+        user, card = create_card(self.PRICE * self.AFFORDABLE)
+        with ThreadPoolExecutor(self.THREADS) as executor:
+            results = list(executor.map(
+                lambda terms: self.subscribe(user, service, terms, card),
+                terms_list,
+            ))
+        card.refresh_from_db()
+        self.assertEqual(results.count('created'), self.AFFORDABLE)
+        self.assertEqual(
+            results.count('rejected'), self.ATTEMPTS - self.AFFORDABLE
+        )
+        self.assertEqual(user.subscriptions.count(), self.AFFORDABLE)
+        self.assertEqual(card.balance, 0)
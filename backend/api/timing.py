@@ -0,0 +1,62 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from rest_framework import serializers
+
+_timer = ContextVar('serializer_timer', default=None)
+
+
+class SerializerTimer:
+    """Время работы сериализаторов за один запрос.
+
+    Учитывается только внешний вызов: вложенные сериализаторы уже входят
+    в его время. db_duration - время запросов к базе, выполненных во время
+    сериализации, например при обходе ленивой выборки.
+    """
+
+    def __init__(self):
+        self.duration = 0.0
+        self.db_duration = 0.0
+        self.depth = 0
+
+
+@contextmanager
+def serializer_timing():
+    """Включает учет времени сериализаторов в текущем контексте"""
+    timer = SerializerTimer()
+    token = _timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _timer.reset(token)
+
+
+def timed(function):
+    """Учет времени вызова в таймере текущего контекста, если он включен"""
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        timer = _timer.get()
+        if timer is None:
+            return function(*args, **kwargs)
+        timer.depth += 1
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            timer.depth -= 1
+            if not timer.depth:
+                timer.duration += time.perf_counter() - started
+    return wrapper
+
+
+def install_serializer_timing():
+    """Оборачивает BaseSerializer.data таймером.
+
+    Serializer.data и ListSerializer.data получают результат через
+    BaseSerializer.data, поэтому учитывается любой сериализатор DRF.
+    """
+    data = serializers.BaseSerializer.data
+    if not getattr(data.fget, '__wrapped__', None):
+        serializers.BaseSerializer.data = property(timed(data.fget))
@@ -21,7 +21,7 @@ app_name = 'api'
 
 urlpatterns = [
     path('main/', MainPageAPIView.as_view(), name='main'),
-    path('comparison/', ComparisonAPIView.as_view(), name='main'),
+    path('comparison/', ComparisonAPIView.as_view(), name='comparison'),
     path('cards/', BankCardView.as_view(), name='cards-list-and-activate'),
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.jwt'))
@@ -1,6 +1,7 @@
 import datetime
 
-from django.db import transaction
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.response import Response
@@ -8,7 +9,121 @@ from rest_framework.response import Response
 from .serializers import (
     SubscriptionSerializer,
 )
-from services.models import Subscription
+from services.models import BankCard, Subscription
+
+
+ACTIVE_SUBSCRIPTION_CONSTRAINT = 'unique_user_service_terms'
+
+
+class SubscribeError(Exception):
+    """Ошибка оформления подписки"""
+
+
+def violates_constraint(error, model, name):
+    """Вызвана ли ошибка IntegrityError ограничением name модели.
+
+    PostgreSQL сообщает имя нарушенного ограничения, SQLite - имя индекса
+    или таблицу и колонки уникального ограничения.
+    """
+    diag = getattr(error.__cause__, 'diag', None)
+    if diag is not None:
+        return diag.constraint_name == name
+    message = str(error)
+    if name in message:
+        return True
+    constraint = next(
+        (item for item in model._meta.constraints if item.name == name),
+        None,
+    )
+    if constraint is None:
+        return False
+    columns = ', '.join(
+        f'{model._meta.db_table}.{model._meta.get_field(field).column}'
+        for field in constraint.fields
+    )
+    return message.endswith(f'constraint failed: {columns}')
+
+
+def debit(bank_card_id, amount):
+    """Списание amount с карты, возвращает новый баланс.
+
+    UPDATE выполняется только при достаточном балансе и возвращает новый
+    баланс через RETURNING тем же запросом. При нехватке средств
+    возвращает None.
+    """
+    quote = connection.ops.quote_name
+    opts = BankCard._meta
+    table = quote(opts.db_table)
+    balance = quote(opts.get_field('balance').column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET {balance} = {balance} - %s '
+            f'WHERE {quote(opts.pk.column)} = %s AND {balance} >= %s '
+            f'RETURNING {balance}',
+            [amount, bank_card_id, amount],
+        )
+        row = cursor.fetchone()
+    return None if row is None else row[0]
+
+
+def create_subscription(user, service, terms, bank_card, start_date):
+    """Оформление подписки со списанием стоимости периода с карты.
+
+    Списание выполняется условным UPDATE, который уменьшает баланс только
+    при достаточном количестве средств, поэтому параллельные подписки не
+    уводят карту в минус. Повторная подписка отклоняется уникальным
+    ограничением, и списание откатывается вместе с ней. Остальные ошибки
+    целостности не маскируются под повторную подписку. Баланс bank_card
+    обновляется значением после списания.
+    """
+    amount_to_pay = terms.period_price
+    end_date = start_date + datetime.timedelta(days=terms.duration_days)
+    try:
+        with transaction.atomic():
+            balance = debit(bank_card.pk, amount_to_pay)
+            if balance is None:
+                raise SubscribeError(
+                    'На банковской карте недостаточно средств '
+                    'для оформления подписки.'
+                )
+            subscription = Subscription.objects.create(
+                service=service,
+                user=user,
+                terms=terms,
+                start_date=start_date,
+                end_date=end_date,
+                renew_at=end_date,
+                bank_card=bank_card
+            )
+    except IntegrityError as error:
+        if not violates_constraint(
+            error, Subscription, ACTIVE_SUBSCRIPTION_CONSTRAINT
+        ):
+            raise
+        raise SubscribeError('Вы уже подписаны на этот сервис.')
+    bank_card.balance = balance
+    return subscription
+
+
+def spending_total(user, field, start_date=None, end_date=None, category=None):
+    """Итог из помесячной сводки расходов пользователя.
+
+    Сводка хранит целые месяцы, поэтому итог возвращается только для
+    периода, который начинается первым и заканчивается последним днем
+    месяца. Для остальных периодов возвращается None.
+    """
+    if start_date and start_date.day != 1:
+        return None
+    if end_date and (end_date + datetime.timedelta(days=1)).day != 1:
+        return None
+    spending = user.monthly_spending.all()
+    if start_date:
+        spending = spending.filter(month__gte=start_date)
+    if end_date:
+        spending = spending.filter(month__lte=end_date)
+    if category:
+        spending = spending.filter(category__name=category)
+    return spending.aggregate(total=Sum(field))['total'] or 0
 
 
 def handle_subscribe_post(request, user, service, terms, bank_card):
@@ -27,59 +142,27 @@ def handle_subscribe_post(request, user, service, terms, bank_card):
     else:
         start_date = timezone.now()
 
-    with transaction.atomic():
-        duration_mapping = {
-            "one_month": 30,
-            "three_months": 90,
-            "six_months": 180,
-            "one_year": 360,
-        }
-        duration_days = duration_mapping.get(terms.duration, 30)
-        amount_to_pay = terms.price * (duration_days / 30)
-
-        if bank_card.balance < amount_to_pay:
-            return Response(
-                {
-                    'errors': 'На банковской карте недостаточно средств'
-                    'для оформления подписки.'
-                },
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        end_date = start_date + datetime.timedelta(days=duration_days)
-
-        if Subscription.objects.filter(
-            service=service,
-            user=user,
-            terms=terms
-        ).exists():
-            return Response(
-                {'errors': 'Вы уже подписаны на этот сервис.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        subscription = Subscription.objects.create(
-            service=service,
-            user=user,
-            terms=terms,
-            start_date=start_date,
-            end_date=end_date,
-            bank_card=bank_card
+    try:
+        subscription = create_subscription(
+            user, service, terms, bank_card, start_date
         )
-        bank_card.balance -= amount_to_pay
-        bank_card.save()
-        serializer = SubscriptionSerializer(
-            subscription,
-            context={'request': request}
+    except SubscribeError as error:
+        return Response(
+            {'errors': str(error)},
+            status=status.HTTP_400_BAD_REQUEST
         )
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    serializer = SubscriptionSerializer(
+        subscription,
+        context={'request': request}
+    )
+    return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
 def handle_subscribe_delete(user, service, terms):
     subscription = user.subscriptions.filter(
         service=service,
         terms=terms
-    ).first()
+    ).order_by('-start_date', '-id').first()
     if not subscription:
         return Response(
             {
@@ -1,8 +1,8 @@
-import datetime
-
-from django.db.models import Q, Sum
+from django.db.models import Sum
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
+from django_filters.utils import translate_validation
 from djoser.views import UserViewSet
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
@@ -12,10 +12,28 @@ from rest_framework.permissions import (
     AllowAny,
     IsAuthenticated
 )
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .filters import ServiceFilter
+from .cache import cached_catalog, cached_main_page
+from .conditional import catalog_tag, conditional, service_tag, terms_tag
+from .filters import (
+    PaidFilter,
+    ServiceFilter,
+    ServiceSearchFilter,
+    SubscriptionFilter,
+)
+from .idempotency import idempotent
+from .pagination import (
+    CashbackCursorPagination,
+    ExpenseCursorPagination,
+    PaidCursorPagination,
+    ServiceCursorPagination,
+    SubscriptionCursorPagination,
+)
+from .payments import project_payments, shift_months, subscription_charges
+from .renderers import ORJSONRenderer
 from .serializers import (
     AdditionalForServiceSerializer,
     BankCardSerializer,
@@ -26,38 +44,52 @@ from .serializers import (
     ExpenseSerializer,
     MainPageSerializer,
     PaidSerializer,
+    PaymentCalendarQuerySerializer,
     ServiceWithTermsSerializer,
     ServiceSerializer,
     TermDetailSerializer,
     UserSerializer,
     UserSubscribeSerializer,
+    ValuesSerializer,
+    featured_services,
+)
+from .sparse import FIELDS_PARAM, SparseFieldsViewMixin, parse_paths
+from .utils import (
+    handle_subscribe_delete,
+    handle_subscribe_post,
+    spending_total,
 )
-from .utils import handle_subscribe_delete, handle_subscribe_post
 from services.models import (
     BankCard,
     Category,
     Comparison,
     Service,
     Subscription,
-    Terms
+    Terms,
+    kopecks_to_rubles,
 )
 from users.models import User
 
+# Рендеры списков, которые строятся из values(): ответ совпадает с
+# JSONRenderer байт в байт, поэтому orjson включен только для них.
+FAST_RENDERERS = (ORJSONRenderer, BrowsableAPIRenderer)
+
 
 class MainPageAPIView(APIView):
 
     def get(self, request, *args, **kwargs):
-        serializer = MainPageSerializer(
-            request.user
-            )
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        data = cached_main_page(
+            request.user,
+            lambda user: MainPageSerializer(user).data
+        )
+        return Response(data, status=status.HTTP_200_OK)
 
 
 class ComparisonAPIView(APIView):
 
     def get(self, request, *args, **kwargs):
         user = request.user
-        comparsion_list = user.user_comparison.all()
+        comparsion_list = user.user_comparison.select_related('service')
         serializer = ComparisonSerializer(
             comparsion_list, many=True, context={'request': request},
             )
@@ -72,157 +104,216 @@ class CustomUserViewSet(UserViewSet):
     permission_classes = (AllowAny,)
     pagination_class = PageNumberPagination
 
+    def paginate_values(self, queryset, serializer_class, *extra):
+        """Страница строк values() для быстрой сериализации списка.
+
+        В выборку кроме полей сериализатора попадают ключи сортировки,
+        по которым пагинатор строит курсор следующей страницы, и поля
+        extra.
+        """
+        serializer = ValuesSerializer(
+            serializer_class,
+            context=self.get_serializer_context(),
+            fields=parse_paths(self.request.query_params.get(FIELDS_PARAM)),
+        )
+        ordering = self.paginator.get_ordering(self.request, queryset, self)
+        page = self.paginate_queryset(serializer.values(
+            queryset, *(field.lstrip('-') for field in ordering), *extra
+        ))
+        return page, serializer
+
+    def period_total(self, window_total, field, period, queryset_total):
+        """Итог за период для ответа со страницей подписок.
+
+        Первая страница выбирается вместе с оконной суммой window_total по
+        всему периоду. Остальные страницы ограничены условием курсора,
+        поэтому итог для них берется из помесячной сводки, а если период
+        не состоит из целых месяцев, считается запросом queryset_total.
+        """
+        if self.paginator.cursor is None:
+            return window_total
+        total = spending_total(
+            self.request.user,
+            field,
+            period['start_date'],
+            period['end_date'],
+            period['category'],
+        )
+        if total is None:
+            total = queryset_total()
+        return total or 0
+
+    def filter_period(self, queryset, filterset_class):
+        """Подписки за период и категорию из параметров запроса.
+
+        Возвращает отфильтрованную выборку и разобранные параметры
+        start_date, end_date и category. Неверные параметры завершают
+        запрос ошибкой 400.
+        """
+        filterset = filterset_class(
+            self.request.query_params, queryset=queryset, request=self.request
+        )
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        return filterset.qs, filterset.form.cleaned_data
+
     @action(
         detail=False,
         methods=['get',],
         permission_classes=(IsAuthenticated,),
+        pagination_class=SubscriptionCursorPagination,
+        renderer_classes=FAST_RENDERERS,
     )
     def subscriptions(self, request):
         """Список подписок пользователя"""
         user = self.request.user
-        queryset = user.subscriptions.all()
-        serializer = UserSubscribeSerializer(
-            queryset, many=True, context={'request': request}
+        page, serializer = self.paginate_values(
+            user.subscriptions.all(), UserSubscribeSerializer
+        )
+        return self.get_paginated_response(
+            serializer.to_representation(page)
         )
-        return Response(serializer.data)
 
     @action(
         detail=False,
         methods=['get',],
         permission_classes=(IsAuthenticated,),
+        pagination_class=CashbackCursorPagination,
     )
     def cashback(self, request):
         """Кэшбэк пользователя"""
         user = self.request.user
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
-        category = request.query_params.get('category')
-        filters = Q(user=user)
-        if category:
-            filters &= Q(service__category__name=category)
-
-        if start_date:
-            start_date = (
-                datetime.datetime.strptime(start_date, '%Y-%m-%d').date()
-            )
-            filters &= Q(start_date__date__gte=start_date)
-
-        if end_date:
-            end_date = datetime.datetime.strptime(end_date, '%Y-%m-%d').date()
-            filters &= Q(start_date__date__lte=end_date)
-
-        queryset = Subscription.objects.filter(filters)
+        queryset, period = self.filter_period(
+            Subscription.objects.filter(user=user), SubscriptionFilter
+        )
+        page = self.paginate_queryset(
+            queryset.select_related(
+                'service__category'
+            ).with_cashback().with_window_total('cashback_kopecks')
+        )
 
-        if not queryset.exists():
+        if not page:
             return Response(
                 {'errors': 'По заданным параметрам подписок не найдено.'},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        total_cashback = sum(
-            sub.terms.price * (sub.terms.cashback / 100) for sub in queryset
+        total_cashback = self.period_total(
+            page[0].window_total,
+            'cashback_kopecks',
+            period,
+            queryset.total_cashback_kopecks,
         )
-
         serializer = CashbackSerializer(
-            queryset,
+            page,
             many=True,
-            context={'request': request}
+            context={'request': request},
+            fields=parse_paths(request.query_params.get(FIELDS_PARAM)),
+        )
+        return self.paginator.get_paginated_response(
+            serializer.data, kopecks_to_rubles(total_cashback)
         )
-        data = serializer.data
-        data.append({'total_cashback': total_cashback})
-        return Response(data)
 
     @action(
         detail=False,
         methods=['get',],
+        pagination_class=ExpenseCursorPagination,
+        renderer_classes=FAST_RENDERERS,
     )
     def expenses(self, request):
         """Расходы пользователя с возможностью фильтрации по датам"""
         user = self.request.user
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
-        category = request.query_params.get('category')
-        filters = Q(user=user)
-        if category:
-            filters &= Q(service__category__name=category)
-
-        if start_date:
-            start_date = (
-                datetime.datetime.strptime(start_date, '%Y-%m-%d').date()
-            )
-            filters &= Q(start_date__date__gte=start_date)
-
-        if end_date:
-            end_date = datetime.datetime.strptime(end_date, '%Y-%m-%d').date()
-            filters &= Q(start_date__date__lte=end_date)
-
-        queryset = Subscription.objects.filter(filters)
+        queryset, period = self.filter_period(
+            Subscription.objects.filter(user=user), SubscriptionFilter
+        )
+        page, serializer = self.paginate_values(
+            queryset.with_window_total('terms__price'),
+            ExpenseSerializer,
+            'window_total',
+        )
 
-        if not queryset.exists():
+        if not page:
             return Response(
                 {'errors': 'По заданным параметрам подписок не найдено.'},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        total_expenses = (
-            queryset.aggregate(Sum('terms__price'))['terms__price__sum'] or 0
+        total_expenses = self.period_total(
+            page[0]['window_total'],
+            'expenses',
+            period,
+            lambda: queryset.aggregate(total=Sum('terms__price'))['total'],
         )
-        serializer = ExpenseSerializer(
-            queryset,
-            many=True,
-            context={'request': request}
+        return self.paginator.get_paginated_response(
+            serializer.to_representation(page), total_expenses
         )
-        data = serializer.data
-        data.append({'total_expenses': total_expenses})
-        return Response(data)
 
     @action(
         detail=False,
         methods=['get',],
+        pagination_class=PaidCursorPagination,
+        renderer_classes=FAST_RENDERERS,
     )
     def paids(self, request):
         """К оплате в этом месяце пользователя"""
         user = self.request.user
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
-        category = request.query_params.get('category')
-        filters = Q(user=user)
-        if category:
-            filters &= Q(service__category__name=category)
-
-        if start_date:
-            start_date = datetime.datetime.strptime(
-                start_date,
-                '%Y-%m-%d'
-            ).date()
-            filters &= Q(end_date__date__gte=start_date)
-
-        if end_date:
-            end_date = datetime.datetime.strptime(
-                end_date,
-                '%Y-%m-%d'
-            ).date()
-            filters &= Q(end_date__date__lte=end_date)
-
-        queryset = Subscription.objects.filter(filters)
-
-        if not queryset.exists():
+        queryset, period = self.filter_period(
+            Subscription.objects.filter(user=user, end_date__isnull=False),
+            PaidFilter,
+        )
+        page, serializer = self.paginate_values(
+            queryset.with_window_total('terms__price'),
+            PaidSerializer,
+            'window_total',
+        )
+
+        if not page:
             return Response(
                 {'errors': 'По заданным параметрам подписок не найдено.'},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        total_paids = (
-            queryset.aggregate(Sum('terms__price'))['terms__price__sum'] or 0
+        total_paids = self.period_total(
+            page[0]['window_total'],
+            'paids',
+            period,
+            lambda: queryset.aggregate(total=Sum('terms__price'))['total'],
         )
-        serializer = PaidSerializer(
-            queryset,
-            many=True,
-            context={'request': request}
+        return self.paginator.get_paginated_response(
+            serializer.to_representation(page), total_paids
         )
-        data = serializer.data
-        data.append({'total_paids': total_paids})
-        return Response(data)
+
+    @action(
+        detail=False,
+        methods=['get',],
+        permission_classes=(IsAuthenticated,),
+    )
+    def calendar(self, request):
+        """Календарь будущих списаний по подпискам пользователя.
+
+        Даты списаний каждой подписки продолжаются с периодом ее тарифа
+        от даты следующего продления. Суммы группируются по дням, неделям
+        или месяцам горизонта в months месяцев от start.
+        """
+        params = PaymentCalendarQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        start = params.validated_data.get('start') or timezone.localdate()
+        end = shift_months(start, params.validated_data['months'])
+        charges = subscription_charges(
+            request.user.subscriptions.filter(
+                renew_at__isnull=False
+            ).values_list('renew_at', 'terms__duration', 'terms__price')
+        )
+        periods = project_payments(
+            charges, start, end, params.validated_data['group']
+        )
+        return Response({
+            'start': start,
+            'end': end,
+            'group': params.validated_data['group'],
+            'total': sum(period['total'] for period in periods),
+            'periods': periods,
+        })
 
     @action(detail=False,
             methods=['GET', 'PATCH'],
@@ -245,7 +336,7 @@ class CustomUserViewSet(UserViewSet):
         )
 
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(SparseFieldsViewMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     pagination_class = PageNumberPagination
@@ -255,14 +346,25 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
         methods=('get',),
         permission_classes=(IsAuthenticated,),
     )
+    @conditional(catalog_tag)
     def catalog(self, request):
         """Каталог пользователя разбитый на категории"""
+        data = cached_catalog(
+            'catalog',
+            lambda: self.build_catalog(request),
+            request.build_absolute_uri(),
+        )
+        return Response(data)
+
+    def build_catalog(self, request):
         queryset = Category.objects.all()
         pages = self.paginate_queryset(queryset)
         serializer = CatalogSerializer(
             pages, many=True, context={'request': request}
         )
-        best_offer = Service.objects.filter(is_featured=True)
+        best_offer = Service.objects.filter(
+            is_featured=True
+        ).prefetch_related('subscription_terms')
         serializer_best_offer = AdditionalForServiceSerializer(
                 best_offer,
                 context={'request': self.request},
@@ -270,13 +372,16 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
             )
         data = serializer.data
         data.append({'best_offer': serializer_best_offer.data})
-        return self.get_paginated_response(data)
+        return self.get_paginated_response(data).data
 
 
-class ServiceViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Service.objects.all()
+class ServiceViewSet(SparseFieldsViewMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Service.objects.select_related('category')
     serializer_class = ServiceSerializer
-    filter_backends = [DjangoFilterBackend, OrderingFilter, SearchFilter]
+    pagination_class = ServiceCursorPagination
+    filter_backends = [
+        DjangoFilterBackend, ServiceSearchFilter, OrderingFilter, SearchFilter
+    ]
     search_fields = ['name']
     filterset_class = ServiceFilter
     ordering_fields = [
@@ -291,41 +396,63 @@ class ServiceViewSet(viewsets.ReadOnlyModelViewSet):
             return ServiceWithTermsSerializer
         return super().get_serializer_class()
 
+    @conditional(catalog_tag)
+    def list(self, request, *args, **kwargs):
+        parent = super()
+        data = cached_catalog(
+            'services',
+            lambda: parent.list(request, *args, **kwargs).data,
+            request.build_absolute_uri(),
+        )
+        return Response(data)
+
+    @conditional(service_tag)
+    def retrieve(self, request, *args, **kwargs):
+        parent = super()
+        data = cached_catalog(
+            'service',
+            lambda: parent.retrieve(request, *args, **kwargs).data,
+            request.build_absolute_uri(),
+        )
+        return Response(data)
+
     @action(
             detail=False,
             methods=['get',],
             url_path='bestoffer'
         )
+    @conditional(catalog_tag)
     def best_offer(self, request):
-        queryset = Service.objects.filter(is_featured=True)
-        if not queryset:
+        data = featured_services(request)
+        if not data:
             return Response(
                 {
                     'errors': 'Лучшие предложения не выбраны администратором.'
                 },
                 status=status.HTTP_400_BAD_REQUEST
             )
-        serializer = ServiceSerializer(
-            queryset, many=True, context={'request': request}
-        )
-        return Response(serializer.data)
+        return Response(data)
 
     @action(
             detail=True,
             methods=['get',],
             url_path='terms/(?P<term_pk>[^/.]+)'
         )
+    @conditional(terms_tag)
     def term_detail(self, request, pk=None, term_pk=None):
-        service = get_object_or_404(Service, pk=pk)
-        term = get_object_or_404(Terms, pk=term_pk, service=service.id)
-        serializer = TermDetailSerializer(term)
-        return Response(serializer.data)
+        def build():
+            service = get_object_or_404(Service, pk=pk)
+            term = get_object_or_404(Terms, pk=term_pk, service=service.id)
+            return TermDetailSerializer(term).data
+
+        return Response(cached_catalog('terms', build, pk, term_pk))
 
     @action(
             detail=True,
             methods=['post', 'delete'],
             url_path='terms/(?P<terms_id>\d+)/subscribe'
         )
+    @idempotent
     def subscribe(self, request, pk=None, terms_id=None):
         user = request.user
         service = get_object_or_404(Service, pk=pk)
@@ -395,6 +522,7 @@ class BankCardView(APIView):
         serializer = BankCardSerializer(cards, many=True)
         return Response(serializer.data)
 
+    @idempotent
     def patch(self, request):
         card_id = request.data.get('card_id')
         if not card_id:
@@ -0,0 +1,39 @@
+# Generated by Django 4.1.2 on 2026-10-18 13:52
+
+from django.db import migrations, models
+from django.db.models import Max, Min, OuterRef, Subquery
+
+
+def fill_terms_summary(apps, schema_editor):
+    Service = apps.get_model('services', 'Service')
+    Terms = apps.get_model('services', 'Terms')
+    terms = Terms.objects.filter(
+        service=OuterRef('pk')
+    ).order_by().values('service')
+    Service.objects.update(
+        min_price=Subquery(terms.annotate(value=Min('price')).values('value')),
+        max_cashback=Subquery(
+            terms.annotate(value=Max('cashback')).values('value')
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='max_cashback',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='Максимальный кэшбэк'),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='min_price',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='Минимальная цена'),
+        ),
+        migrations.RunPython(fill_terms_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.1.2 on 2026-10-18 13:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import services.models
+
+
+def fill_monthly_spending(apps, schema_editor):
+    apps.get_model('services', 'MonthlySpending').objects.rebuild()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('services', '0003_service_terms_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlySpending',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Месяц')),
+                ('expenses', models.PositiveBigIntegerField(default=0, verbose_name='Расходы')),
+                ('paids', models.PositiveBigIntegerField(default=0, verbose_name='Платежи')),
+                ('cashback_kopecks', models.PositiveBigIntegerField(default=0, verbose_name='Кэшбэк в копейках')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_spending', to='services.category', verbose_name='Категория')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_spending', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Сводка расходов',
+                'verbose_name_plural': 'Сводки расходов',
+                'ordering': ('user', 'month', 'category'),
+            },
+            managers=[
+                ('objects', services.models.MonthlySpendingManager()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='monthlyspending',
+            constraint=models.UniqueConstraint(fields=('user', 'month', 'category'), name='unique_monthly_spending'),
+        ),
+        migrations.RunPython(fill_monthly_spending, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.1.2 on 2026-10-18 13:57
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('services', '0004_monthly_spending'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bankcard',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['user'], name='bankcard_active_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['user', 'start_date'], name='subscription_user_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['user', 'end_date'], name='subscription_user_end_idx'),
+        ),
+        migrations.AlterField(
+            model_name='subscription',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='subscriptions', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.1.2 on 2026-10-18 14:00
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+SEARCH_INDEXES = {
+    'service_name_trgm_idx': (
+        'services_service USING gin (name gin_trgm_ops)'
+    ),
+    'category_name_trgm_idx': (
+        'services_category USING gin (name gin_trgm_ops)'
+    ),
+    'service_search_vector_idx': (
+        'services_service USING gin (search_vector)'
+    ),
+}
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Service = apps.get_model('services', 'Service')
+    Service.objects.update(search_vector=(
+        SearchVector('name', weight='A', config='russian')
+        + SearchVector('text', weight='B', config='russian')
+    ))
+    for name, target in SEARCH_INDEXES.items():
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {target}')
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0005_subscription_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='service',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
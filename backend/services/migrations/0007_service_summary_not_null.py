@@ -0,0 +1,23 @@
+# Generated by Django 4.1.2 on 2026-10-18 14:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0006_service_search'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='service',
+            name='max_cashback',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Максимальный кэшбэк'),
+        ),
+        migrations.AlterField(
+            model_name='service',
+            name='min_price',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Минимальная цена'),
+        ),
+    ]
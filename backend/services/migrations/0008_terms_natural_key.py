@@ -0,0 +1,40 @@
+# Generated by Django 4.1.2 on 2026-10-18 14:03
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def rename_duplicate_terms(apps, schema_editor):
+    """Делает уникальными названия тарифов внутри одного сервиса.
+
+    На тарифы могут ссылаться подписки, поэтому повторы не удаляются,
+    а получают в названии свой идентификатор.
+    """
+    Terms = apps.get_model('services', 'Terms')
+    duplicates = Terms.objects.order_by().values(
+        'service', 'name'
+    ).annotate(first_id=Min('id'), count=Count('id')).filter(count__gt=1)
+    for duplicate in duplicates:
+        for terms in Terms.objects.filter(
+            service=duplicate['service'], name=duplicate['name']
+        ).exclude(id=duplicate['first_id']):
+            suffix = f' #{terms.id}'
+            terms.name = terms.name[:150 - len(suffix)] + suffix
+            terms.save(update_fields=['name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0007_service_summary_not_null'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            rename_duplicate_terms, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='terms',
+            constraint=models.UniqueConstraint(fields=('service', 'name'), name='unique_service_terms_name'),
+        ),
+    ]
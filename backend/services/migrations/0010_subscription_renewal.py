@@ -0,0 +1,49 @@
+# Generated by Django 4.1.2 on 2026-10-18 14:24
+
+from django.db import migrations, models
+from django.db.models import F
+from django.utils import timezone
+
+
+def schedule_renewals(apps, schema_editor):
+    """Назначает продление действующим подпискам.
+
+    Подписки, срок которых уже истек, считаются завершенными: продление
+    не списывает с карт деньги за прошедшие периоды.
+    """
+    Subscription = apps.get_model('services', 'Subscription')
+    Subscription.objects.filter(end_date__gte=timezone.now()).update(
+        renew_at=F('end_date')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0009_catalog_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscription',
+            name='renew_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Дата следующей попытки продления'),
+        ),
+        migrations.AddField(
+            model_name='subscription',
+            name='renewal_attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Неудачных попыток продления'),
+        ),
+        migrations.AddField(
+            model_name='subscription',
+            name='renewal_error',
+            field=models.CharField(blank=True, max_length=255, verbose_name='Ошибка последнего продления'),
+        ),
+        migrations.RunPython(
+            schedule_renewals, migrations.RunPython.noop
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(condition=models.Q(('renew_at__isnull', False)), fields=['renew_at'], name='subscription_renew_at_idx'),
+        ),
+    ]
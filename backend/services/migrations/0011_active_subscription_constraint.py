@@ -0,0 +1,66 @@
+# Generated by Django 4.1.2 on 2026-10-18 14:52
+
+from django.db import IntegrityError, migrations, models
+from django.db.models import Count
+
+CONSTRAINT = 'unique_user_service_terms'
+
+
+def check_active_duplicates(apps, schema_editor):
+    """Останавливает миграцию, если есть повторные активные подписки.
+
+    Завершенные подписки - история платежей и под ограничение не попадают,
+    повторы среди активных нужно разобрать вручную.
+    """
+    Subscription = apps.get_model('services', 'Subscription')
+    duplicates = Subscription.objects.filter(
+        renew_at__isnull=False
+    ).order_by().values('user', 'service', 'terms').annotate(
+        count=Count('id')
+    ).filter(count__gt=1)
+    if duplicates.exists():
+        examples = ', '.join(
+            f'пользователь {item["user"]}, сервис {item["service"]}, '
+            f'тариф {item["terms"]}'
+            for item in duplicates[:10]
+        )
+        raise IntegrityError(
+            f'Найдено {duplicates.count()} повторных активных подписок на '
+            f'один тариф ({examples}). Ограничение не добавлено, повторы '
+            'нужно разобрать вручную.'
+        )
+
+
+def drop_full_constraint(apps, schema_editor):
+    """Удаляет ограничение на все подписки из прежней версии 0005"""
+    Subscription = apps.get_model('services', 'Subscription')
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(
+            cursor, Subscription._meta.db_table
+        )
+    if CONSTRAINT in constraints:
+        schema_editor.remove_constraint(
+            Subscription,
+            models.UniqueConstraint(
+                fields=('user', 'service', 'terms'), name=CONSTRAINT
+            ),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0010_subscription_renewal'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            check_active_duplicates, migrations.RunPython.noop
+        ),
+        migrations.RunPython(drop_full_constraint, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.UniqueConstraint(condition=models.Q(('renew_at__isnull', False)), fields=('user', 'service', 'terms'), name='unique_user_service_terms'),
+        ),
+    ]
@@ -1,11 +1,71 @@
+import datetime
+from decimal import Decimal
+
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    SearchVectorField,
+    TrigramWordSimilarity,
+)
 from django.core.validators import RegexValidator
-from django.db import models
-from django.db.models import Min, Max
+from django.db import connections, models, transaction
+from django.db.models import (
+    Case,
+    DateField,
+    F,
+    IntegerField,
+    Max,
+    Min,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+    Window,
+)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import (
+    Cast,
+    Coalesce,
+    RowNumber,
+    TruncMonth,
+)
 
 User = get_user_model()
 
+SEARCH_CONFIG = 'russian'
+# Множитель ранга поиска перед округлением до целого
+RANK_SCALE = 10 ** 6
+
+
+def kopecks_to_rubles(value):
+    """Перевод суммы в копейках в рубли без потери точности"""
+    return Decimal(value or 0).scaleb(-2)
+
+
+def month_of(value):
+    """Первое число месяца даты в текущем часовом поясе"""
+    if isinstance(value, datetime.datetime):
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        value = timezone.localtime(value).date()
+    return value.replace(day=1)
+
+
+def month_bounds(month):
+    """Начало месяца и начало следующего месяца в текущем часовом поясе"""
+    next_month = (month + datetime.timedelta(days=32)).replace(day=1)
+    return (
+        timezone.make_aware(datetime.datetime.combine(month, datetime.time())),
+        timezone.make_aware(
+            datetime.datetime.combine(next_month, datetime.time())
+        ),
+    )
+
 
 class Category(models.Model):
     """Модель для описания категории"""
@@ -22,6 +82,10 @@ class Category(models.Model):
         ],
         verbose_name='Название категории'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
 
     class Meta:
         """Мета-параметры модели"""
@@ -36,12 +100,92 @@ class Category(models.Model):
         return self.name
 
 
-class ServiceManager(models.Manager):
-    def get_queryset(self):
-        return super().get_queryset().annotate(
-            min_price=Min('subscription_terms__price'),
-            max_cashback=Max('subscription_terms__cashback')
+class ServiceQuerySet(models.QuerySet):
+    """Набор запросов сервисов"""
+
+    def refresh_terms_summary(self):
+        """Пересчет минимальной цены и максимального кэшбэка по тарифам.
+
+        Тарифы входят в карточку сервиса, поэтому вместе со сводкой
+        обновляется и дата изменения сервиса.
+        """
+        terms = Terms.objects.filter(
+            service=OuterRef('pk')
+        ).order_by().values('service')
+        return self.update(
+            updated_at=timezone.now(),
+            min_price=Coalesce(Subquery(
+                terms.annotate(value=Min('price')).values('value')
+            ), 0),
+            max_cashback=Coalesce(Subquery(
+                terms.annotate(value=Max('cashback')).values('value')
+            ), 0),
+        )
+
+    def top_per_category(self, limit):
+        """Первые limit сервисов каждой категории одним оконным запросом"""
+        ranked = self.order_by().annotate(
+            category_position=Window(
+                expression=RowNumber(),
+                partition_by=F('category_id'),
+                order_by=F('id').asc(),
+            )
+        ).values('id', 'category_position')
+        sql, params = ranked.query.sql_with_params()
+        return self.filter(pk__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) ranked '
+            'WHERE ranked.category_position <= %s',
+            (*params, limit),
+        ))
+
+    def refresh_search_vector(self):
+        """Пересчет поискового вектора по названию и описанию сервиса"""
+        if connections[self.db].vendor != 'postgresql':
+            return 0
+        return self.update(search_vector=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+        ))
+
+    def search(self, text):
+        """Поиск по названию, описанию и категории с ранжированием.
+
+        В PostgreSQL используется полнотекстовый поиск по search_vector и
+        триграммное сходство названий сервиса и категории, которое
+        допускает опечатки. В остальных базах выполняется поиск по
+        вхождению подстроки. Ранг - целое число, а не float4 из
+        SearchRank: курсор пагинации сравнивает его с сохраненным
+        значением точно, без потери точности при переводе в строку.
+        """
+        if connections[self.db].vendor != 'postgresql':
+            return self.filter(
+                Q(name__icontains=text)
+                | Q(text__icontains=text)
+                | Q(category__name__icontains=text)
+            ).annotate(rank=Case(
+                When(name__iexact=text, then=Value(3 * RANK_SCALE)),
+                When(name__istartswith=text, then=Value(2 * RANK_SCALE)),
+                When(name__icontains=text, then=Value(RANK_SCALE * 3 // 2)),
+                When(category__name__icontains=text, then=Value(RANK_SCALE)),
+                default=Value(RANK_SCALE // 2),
+                output_field=IntegerField(),
+            )).order_by('-rank', 'id')
+
+        query = SearchQuery(
+            text, config=SEARCH_CONFIG, search_type='websearch'
         )
+        return self.filter(
+            Q(search_vector=query)
+            | Q(name__trigram_word_similar=text)
+            | Q(category__name__trigram_word_similar=text)
+        ).annotate(rank=Cast(
+            (
+                SearchRank(F('search_vector'), query)
+                + TrigramWordSimilarity(text, 'name')
+                + TrigramWordSimilarity(text, 'category__name') / 2
+            ) * RANK_SCALE,
+            IntegerField(),
+        )).order_by('-rank', 'id')
 
 
 class Service(models.Model):
@@ -77,7 +221,28 @@ class Service(models.Model):
         default=False,
         verbose_name='Лучшее предложение'
     )
-    objects = ServiceManager()
+    min_price = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        db_index=True,
+        verbose_name='Минимальная цена'
+    )
+    max_cashback = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        db_index=True,
+        verbose_name='Максимальный кэшбэк'
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+    objects = ServiceQuerySet.as_manager()
 
     class Meta:
         """Мета-параметры модели"""
@@ -102,6 +267,13 @@ class Terms(models.Model):
         ("one_year", "Один год"),
     ]
 
+    DURATION_DAYS = {
+        "one_month": 30,
+        "three_months": 90,
+        "six_months": 180,
+        "one_year": 360,
+    }
+
     SUB_TYPE = [
         ('free', 'Бесплатная подписка'),
         ('paid', 'Платная подписка'),
@@ -134,15 +306,44 @@ class Terms(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Связанный сервис',
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
 
     class Meta:
         ordering = ('id',)
         verbose_name = 'Условия подписки'
         verbose_name_plural = 'Условия подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('service', 'name'),
+                name='unique_service_terms_name',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name}'
 
+    @classmethod
+    def period_terms(cls, duration, price):
+        """Продолжительность периода в днях и его стоимость.
+
+        Цена тарифа указана за 30 дней.
+        """
+        days = cls.DURATION_DAYS.get(duration, 30)
+        return days, price * days // 30
+
+    @property
+    def duration_days(self):
+        """Продолжительность оплачиваемого периода в днях"""
+        return self.period_terms(self.duration, self.price)[0]
+
+    @property
+    def period_price(self):
+        """Стоимость оплачиваемого периода"""
+        return self.period_terms(self.duration, self.price)[1]
+
 
 class BankCard(models.Model):
     """Модель банковской карты для демонстрационных целей."""
@@ -165,6 +366,13 @@ class BankCard(models.Model):
     class Meta:
         verbose_name = 'Банковская карта'
         verbose_name_plural = 'Банковские карты'
+        indexes = [
+            models.Index(
+                fields=('user',),
+                condition=Q(is_active=True),
+                name='bankcard_active_user_idx',
+            ),
+        ]
 
     def __str__(self):
         return (
@@ -172,11 +380,52 @@ class BankCard(models.Model):
         )
 
 
+class SubscriptionQuerySet(models.QuerySet):
+    """Набор запросов подписок"""
+
+    CASHBACK_KOPECKS = F('terms__price') * F('terms__cashback')
+
+    def with_cashback(self):
+        """Кэшбэк каждой подписки в копейках.
+
+        Цена в рублях, умноженная на процент кэшбэка, дает сумму кэшбэка
+        в копейках, поэтому расчет ведется в целых числах.
+        """
+        return self.annotate(cashback_kopecks=self.CASHBACK_KOPECKS)
+
+    def total_cashback_kopecks(self):
+        """Общий кэшбэк выборки в копейках"""
+        return self.aggregate(
+            total=Sum(self.CASHBACK_KOPECKS)
+        )['total'] or 0
+
+    def due_for_renewal(self, cutoff, now=None):
+        """Подписки, которые пора продлить.
+
+        Первая попытка выполняется для подписок со сроком продления до
+        cutoff, повторные после неудачи - не раньше назначенного времени.
+        """
+        now = now or timezone.now()
+        return self.filter(renew_at__lte=cutoff).filter(
+            Q(renewal_attempts=0) | Q(renew_at__lte=now)
+        )
+
+    def with_window_total(self, expression):
+        """Сумма expression по всей выборке в каждой строке.
+
+        Оконная сумма window_total считается тем же запросом, что и
+        строки, до среза LIMIT, поэтому любая строка страницы несет итог
+        по всем подпискам выборки.
+        """
+        return self.annotate(window_total=Window(Sum(expression)))
+
+
 class Subscription(models.Model):
     """Модель подписки."""
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_index=False,
         related_name='subscriptions',
         verbose_name='Подписчик',
     )
@@ -209,12 +458,49 @@ class Subscription(models.Model):
         related_name='subscriptions',
         verbose_name='Банковская карта',
     )
+    renew_at = models.DateTimeField(
+        blank=True, null=True,
+        verbose_name='Дата следующей попытки продления'
+    )
+    renewal_attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Неудачных попыток продления'
+    )
+    renewal_error = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name='Ошибка последнего продления'
+    )
+    objects = SubscriptionQuerySet.as_manager()
 
     class Meta:
-        # unique_together = ('user', 'service', 'terms')
         ordering = ('id',)
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        constraints = [
+            # Одна действующая подписка на тариф: завершенные периоды и
+            # подписки без продления в ограничение не входят.
+            models.UniqueConstraint(
+                fields=('user', 'service', 'terms'),
+                name='unique_user_service_terms',
+                condition=Q(renew_at__isnull=False),
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', 'start_date'),
+                name='subscription_user_start_idx',
+            ),
+            models.Index(
+                fields=('user', 'end_date'),
+                name='subscription_user_end_idx',
+            ),
+            models.Index(
+                fields=('renew_at',),
+                name='subscription_renew_at_idx',
+                condition=Q(renew_at__isnull=False),
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user} подписан на {self.service}'
@@ -243,3 +529,150 @@ class Comparison(models.Model):
 
     def __str__(self):
         return f'{self.sercvice} в списке сранения пользователя {self.user}'
+
+
+class MonthlySpendingQuerySet(models.QuerySet):
+    """Набор запросов помесячной сводки расходов"""
+
+    def rebuild(self, user_ids=None, months=None):
+        """Пересчет сводки по подпискам.
+
+        user_ids ограничивает пересчет пользователями, months - месяцами
+        (первыми числами месяцев). Без ограничений сводка строится заново.
+        Связанная модель берется из реестра модели, поэтому метод работает
+        и в миграциях.
+        """
+        Subscription = self.model._meta.apps.get_model(
+            'services', 'Subscription'
+        )
+        subscriptions = Subscription.objects.order_by()
+        spending = self.all()
+        if user_ids is not None:
+            subscriptions = subscriptions.filter(user_id__in=user_ids)
+            spending = spending.filter(user_id__in=user_ids)
+        started = subscriptions
+        ended = subscriptions.filter(end_date__isnull=False)
+        if months is not None:
+            months = sorted(set(months))
+            started_in, ended_in = Q(), Q()
+            for month in months:
+                start, end = month_bounds(month)
+                started_in |= Q(start_date__gte=start, start_date__lt=end)
+                ended_in |= Q(end_date__gte=start, end_date__lt=end)
+            started = started.filter(started_in)
+            ended = ended.filter(ended_in)
+            spending = spending.filter(month__in=months)
+
+        with transaction.atomic():
+            if user_ids is not None:
+                # Блокировка пользователей упорядочивает параллельные
+                # пересчеты одних и тех же ячеек сводки.
+                User = self.model._meta.get_field('user').related_model
+                list(User.objects.select_for_update().filter(
+                    id__in=user_ids
+                ).order_by('id').values_list('id', flat=True))
+            rows = self.collect_rows(started, ended)
+            spending.delete()
+            self.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+    def collect_rows(self, started, ended):
+        """Строки сводки из начатых и завершающихся подписок"""
+        rows = {}
+
+        def row(item):
+            key = (item['user_id'], item['month'], item['category_id'])
+            if key not in rows:
+                rows[key] = self.model(
+                    user_id=key[0], month=key[1], category_id=key[2]
+                )
+            return rows[key]
+
+        for item in started.values(
+            'user_id',
+            month=TruncMonth('start_date', output_field=DateField()),
+            category_id=F('service__category_id'),
+        ).annotate(
+            total_expenses=Sum('terms__price'),
+            total_cashback_kopecks=Sum(
+                F('terms__price') * F('terms__cashback')
+            ),
+        ):
+            spending_row = row(item)
+            spending_row.expenses = item['total_expenses']
+            spending_row.cashback_kopecks = item['total_cashback_kopecks']
+
+        for item in ended.values(
+            'user_id',
+            month=TruncMonth('end_date', output_field=DateField()),
+            category_id=F('service__category_id'),
+        ).annotate(total_paids=Sum('terms__price')):
+            row(item).paids = item['total_paids']
+
+        return list(rows.values())
+
+    def totals(self):
+        """Суммы расходов, платежей и кэшбэка по выборке"""
+        return self.aggregate(
+            expenses=Coalesce(Sum('expenses'), 0),
+            paids=Coalesce(Sum('paids'), 0),
+            cashback_kopecks=Coalesce(Sum('cashback_kopecks'), 0),
+        )
+
+
+class MonthlySpendingManager(
+    models.Manager.from_queryset(MonthlySpendingQuerySet)
+):
+    use_in_migrations = True
+
+
+class MonthlySpending(models.Model):
+    """Помесячная сводка расходов пользователя по категориям.
+
+    Расходы и кэшбэк относятся к месяцу начала подписки, платежи - к
+    месяцу ее окончания. Сводка обновляется сигналами при изменении
+    подписок и пересчитывается командой rebuild_monthly_spending.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='monthly_spending',
+        verbose_name='Пользователь',
+    )
+    month = models.DateField(
+        verbose_name='Месяц'
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='monthly_spending',
+        verbose_name='Категория',
+    )
+    expenses = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Расходы'
+    )
+    paids = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Платежи'
+    )
+    cashback_kopecks = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Кэшбэк в копейках'
+    )
+    objects = MonthlySpendingManager()
+
+    class Meta:
+        ordering = ('user', 'month', 'category')
+        verbose_name = 'Сводка расходов'
+        verbose_name_plural = 'Сводки расходов'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'month', 'category'),
+                name='unique_monthly_spending',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.month:%m.%Y} {self.category}'
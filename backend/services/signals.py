@@ -0,0 +1,74 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .models import MonthlySpending, Service, Subscription, Terms, month_of
+
+
+@receiver(post_init, sender=Terms)
+def remember_terms_service(sender, instance, **kwargs):
+    """Запоминает сервис тарифа при загрузке"""
+    instance._initial_service_id = instance.__dict__.get('service_id')
+
+
+@receiver(post_save, sender=Terms)
+@receiver(post_delete, sender=Terms)
+def refresh_service_summary(sender, instance, raw=False, **kwargs):
+    """Обновляет сводные цену и кэшбэк сервиса при изменении тарифов"""
+    if raw:
+        return
+    service_ids = {instance.service_id, instance._initial_service_id}
+    service_ids.discard(None)
+    Service.objects.filter(pk__in=service_ids).refresh_terms_summary()
+    instance._initial_service_id = instance.service_id
+
+
+def _subscription_state(instance):
+    """Поля подписки, от которых зависит помесячная сводка"""
+    return (
+        instance.__dict__.get('user_id'),
+        instance.__dict__.get('start_date'),
+        instance.__dict__.get('end_date'),
+    )
+
+
+@receiver(post_init, sender=Subscription)
+def remember_subscription_state(sender, instance, **kwargs):
+    """Запоминает пользователя и даты подписки при загрузке"""
+    instance._initial_state = _subscription_state(instance)
+
+
+def _rebuild_spending(*states):
+    """Пересчет сводки для пользователей и месяцев из состояний подписок"""
+    user_ids, months = set(), set()
+    for user_id, start_date, end_date in states:
+        if user_id is None:
+            continue
+        user_ids.add(user_id)
+        months.update(
+            month_of(value) for value in (start_date, end_date) if value
+        )
+    if user_ids and months:
+        MonthlySpending.objects.rebuild(user_ids=user_ids, months=months)
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_saved(sender, instance, raw=False, **kwargs):
+    """Обновляет помесячную сводку при создании и изменении подписки"""
+    if raw:
+        return
+    state = _subscription_state(instance)
+    _rebuild_spending(instance._initial_state, state)
+    instance._initial_state = state
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, **kwargs):
+    """Обновляет помесячную сводку при удалении подписки"""
+    _rebuild_spending(_subscription_state(instance))
+
+
+@receiver(post_save, sender=Service)
+def refresh_search_vector(sender, instance, raw=False, **kwargs):
+    """Обновляет поисковый вектор сервиса после сохранения"""
+    if not raw:
+        Service.objects.filter(pk=instance.pk).refresh_search_vector()